@@ -0,0 +1,143 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Measure the sustained request rate of fetching KEGG resources from a stub server."""
+
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from metanetx_post.etl import SharedTokenBucket, fetch_kegg_resources, reaction_fetcher
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Respond to every request after a random delay unless it is throttled."""
+
+    mean_latency = 0.2
+    slow_fraction = 0.05
+    slow_latency = 3.0
+    # The number of requests per second above which requests are rejected.
+    server_limit = float("inf")
+    arrivals = deque()
+    lock = threading.Lock()
+
+    def do_GET(self):  # noqa: N802
+        """Answer with a small flat file entry."""
+        with self.lock:
+            now = time.monotonic()
+            while self.arrivals and self.arrivals[0] < now - 1:
+                self.arrivals.popleft()
+            throttled = len(self.arrivals) >= self.server_limit
+            self.arrivals.append(now)
+        if throttled:
+            self.send_response(403)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if random.random() < self.slow_fraction:
+            time.sleep(self.slow_latency)
+        else:
+            time.sleep(random.expovariate(1 / self.mean_latency))
+        body = f"ENTRY       {self.path.rsplit('/', 1)[-1]}\n///\n".encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Silence the request log."""
+        pass
+
+
+def fetch(identifiers, url, args, shared):
+    """Fetch the resources in one process, optionally sharing a rate limit."""
+    shared_bucket = None
+    if shared is not None:
+        shared_bucket = SharedTokenBucket(path=shared, rate=args.rate)
+    with shared_bucket or nullcontext():
+        asyncio.run(
+            fetch_kegg_resources(
+                identifiers,
+                reaction_fetcher,
+                url,
+                requests_per_second=args.rate,
+                max_concurrency=args.concurrency,
+                shared_bucket=shared_bucket,
+            )
+        )
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=StubHandler.mean_latency)
+    parser.add_argument(
+        "--server-limit",
+        type=float,
+        default=StubHandler.server_limit,
+        help="The requests per second above which the stub server throttles.",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="The number of concurrent processes each fetching all requests.",
+    )
+    parser.add_argument(
+        "--shared",
+        action="store_true",
+        help="Let the processes share one rate limit.",
+    )
+    args = parser.parse_args()
+    StubHandler.mean_latency = args.latency
+    StubHandler.server_limit = args.server_limit
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/get/"
+    identifiers = [f"R{i:05d}" for i in range(args.requests)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        shared = Path(tmpdir) / "bucket.db" if args.shared else None
+        processes = [
+            multiprocessing.Process(target=fetch, args=(identifiers, url, args, shared))
+            for _ in range(args.processes)
+        ]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        delta = time.perf_counter() - start
+    server.shutdown()
+    total = args.requests * args.processes
+    print(
+        f"{total} requests in {delta:.2f} s: {total / delta:.2f} requests per "
+        f"second (target {args.rate:.2f})."
+    )
+
+
+if __name__ == "__main__":
+    main()
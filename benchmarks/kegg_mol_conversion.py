@@ -0,0 +1,72 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Measure how the KEGG MOL block conversion scales with the number of processes."""
+
+
+import argparse
+import os
+import time
+
+import rdkit.Chem as chem
+
+from metanetx_post.api.compound import kegg as kegg_api
+from metanetx_post.model import KEGGResponseModel
+from metanetx_post.model.rdkit_molecule_adapter import RDKitMoleculeAdapter
+
+
+SMILES = [
+    "O",
+    "C(C1C(C(C(C(O1)O)O)O)O)O",
+    "C1=NC(=C2C(=N1)N(C=N2)C3C(C(C(O3)COP(=O)(O)OP(=O)(O)OP(=O)(O)O)O)O)N",
+    "CC(=O)SCCNC(=O)CCNC(=O)C(C(C)(C)COP(=O)(O)OP(=O)(O)OCC1C(C(C(O1)N2C=NC3=C(N=CN"
+    "=C32)N)O)OP(=O)(O)O)O",
+    "C1=CC(=C[N+](=C1)C2C(C(C(O2)COP(=O)([O-])OP(=O)(O)OCC3C(C(C(O3)N4C=NC5=C(N=CN="
+    "C54)N)O)O)O)O)C(=O)N",
+]
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--compounds", type=int, default=20000)
+    parser.add_argument(
+        "--processes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()]
+    )
+    args = parser.parse_args()
+    blocks = [chem.MolToMolBlock(chem.MolFromSmiles(s)) for s in SMILES]
+    responses = [
+        KEGGResponseModel(
+            identifier=f"C{i:05d}", status_code=200, response=blocks[i % len(blocks)]
+        )
+        for i in range(args.compounds)
+    ]
+    baseline = None
+    for processes in sorted(set(args.processes)):
+        start = time.perf_counter()
+        result = kegg_api.transform(
+            iter(responses), RDKitMoleculeAdapter, processes=processes
+        )
+        delta = time.perf_counter() - start
+        if baseline is None:
+            baseline = delta
+        print(
+            f"{processes} process(es): {len(result)} structures in {delta:.2f} s "
+            f"(speed-up {baseline / delta:.2f})."
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Compare computing molecule properties one by one with computing them at once."""
+
+
+import argparse
+import time
+from importlib import import_module
+
+
+BACKENDS = {
+    "rdkit": ("rdkit_molecule_adapter", "RDKitMoleculeAdapter"),
+    "openbabel": ("openbabel_molecule_adapter", "OpenBabelMoleculeAdapter"),
+}
+
+
+SMILES = [
+    "O",
+    "C(C1C(C(C(C(O1)O)O)O)O)O",
+    "C1=NC(=C2C(=N1)N(C=N2)C3C(C(C(O3)COP(=O)(O)OP(=O)(O)OP(=O)(O)O)O)O)N",
+    "CC(=O)SCCNC(=O)CCNC(=O)C(C(C)(C)COP(=O)(O)OP(=O)(O)OCC1C(C(C(O1)N2C=NC3=C(N=CN"
+    "=C32)N)O)OP(=O)(O)O)O",
+    "C1=CC(=C[N+](=C1)C2C(C(C(O2)COP(=O)([O-])OP(=O)(O)OCC3C(C(C(O3)N4C=NC5=C(N=CN="
+    "C54)N)O)O)O)O)C(=O)N",
+]
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--molecules", type=int, default=2000)
+    parser.add_argument(
+        "--backend", choices=sorted(BACKENDS), nargs="+", default=sorted(BACKENDS)
+    )
+    args = parser.parse_args()
+    for backend in args.backend:
+        module, name = BACKENDS[backend]
+        try:
+            adapter = getattr(import_module(f"metanetx_post.model.{module}"), name)
+        except ModuleNotFoundError:
+            print(f"{backend}: not installed.")
+            continue
+        inchis = [
+            adapter.from_smiles(SMILES[i % len(SMILES)]).get_inchi()
+            for i in range(args.molecules)
+        ]
+        start = time.perf_counter()
+        separate = []
+        for inchi in inchis:
+            molecule = adapter.from_inchi(inchi)
+            separate.append(
+                {
+                    field: getattr(molecule, getter)()
+                    for field, getter in adapter.properties.items()
+                }
+            )
+        delta_separate = time.perf_counter() - start
+        start = time.perf_counter()
+        combined = adapter.compute_many(inchis)
+        delta_combined = time.perf_counter() - start
+        assert combined == separate, "The computed properties differ."
+        print(
+            f"{backend}: {len(inchis)} molecules with separate getters in "
+            f"{delta_separate:.2f} s, at once in {delta_combined:.2f} s "
+            f"(speed-up {delta_separate / delta_combined:.2f})."
+        )
+
+
+if __name__ == "__main__":
+    main()
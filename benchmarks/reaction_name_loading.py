@@ -0,0 +1,102 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Compare the reaction by reaction and the vectorized reaction name loading."""
+
+
+import argparse
+import time
+
+from cobra_component_models.orm import (
+    Base,
+    Namespace,
+    Reaction,
+    ReactionAnnotation,
+    ReactionName,
+)
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from metanetx_post.api.reaction import kegg as kegg_api
+
+
+Session = sessionmaker()
+
+
+def populate(session, num_reactions):
+    """Create reactions that each have one KEGG identifier and one existing name."""
+    namespace = Namespace(
+        miriam_id="MIR:00000013", prefix="kegg.reaction", pattern=r"^R\d{5}$"
+    )
+    session.add(namespace)
+    session.flush()
+    session.bulk_insert_mappings(
+        Reaction, [{"id": i} for i in range(1, num_reactions + 1)]
+    )
+    session.bulk_insert_mappings(
+        ReactionAnnotation,
+        [
+            {
+                "reaction_id": i,
+                "namespace_id": namespace.id,
+                "identifier": f"R{i:05d}",
+            }
+            for i in range(1, num_reactions + 1)
+        ],
+    )
+    session.bulk_insert_mappings(
+        ReactionName,
+        [
+            {"reaction_id": i, "namespace_id": namespace.id, "name": f"name {i}"}
+            for i in range(1, num_reactions + 1)
+        ],
+    )
+    session.commit()
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reactions", type=int, default=40000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    id2names = {
+        f"R{i:05d}": {f"name {i}", f"other name {i}", f"alias {i}"}
+        for i in range(1, args.reactions + 1)
+    }
+    results = {}
+    for vectorized in (False, True):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        session = Session(bind=engine)
+        populate(session, args.reactions)
+        start = time.perf_counter()
+        kegg_api.load(
+            session, id2names, batch_size=args.batch_size, vectorized=vectorized
+        )
+        delta = time.perf_counter() - start
+        results[vectorized] = set(
+            session.query(ReactionName.reaction_id, ReactionName.name)
+        )
+        session.close()
+        print(
+            f"{'vectorized' if vectorized else 'reaction by reaction'}: "
+            f"{len(results[vectorized])} names in {delta:.2f} s."
+        )
+    assert results[False] == results[True], "The loaded names differ."
+
+
+if __name__ == "__main__":
+    main()
@@ -16,25 +16,43 @@
 """Populate compound information."""
 
 
-import asyncio
+import hashlib
 import logging
 from collections import Counter
-from typing import Dict, Type
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Type, Union
 
+import pandas as pd
 from cobra_component_models.builder import CompoundBuilder
-from cobra_component_models.orm import Compound, CompoundAnnotation, Namespace
-from pandas import DataFrame, read_csv, read_sql_query
-from sqlalchemy.orm import selectinload, sessionmaker
+from cobra_component_models.orm import (
+    Compound,
+    CompoundAnnotation,
+    Namespace,
+    Participant,
+)
+from pandas import Series
+from sqlalchemy import distinct, func
+from sqlalchemy.orm import Query, selectinload, sessionmaker
 from tqdm import tqdm
 
-from ...etl import fetch_kegg_list, fetch_kegg_resources, kegg_mol_fetcher
+from ...etl import (
+    KEGGResponseStore,
+    SharedTokenBucket,
+    StructurePropertyCache,
+    create_worker_map,
+    kegg_mol_fetcher,
+    split_kegg_mol_blocks,
+)
 from ...model import (
     AbstractMoleculeAdapter,
     InChIConflict,
     InChIConflictReport,
-    KEGGResponsesModel,
+    KEGGResponseModel,
 )
-from ..helpers import summarize_responses
+from ..helpers import extract_kegg_resources, read_query_frames, summarize_responses
+from .structure import PROPERTIES
 
 
 __all__ = ("extract", "transform", "load")
@@ -48,186 +66,416 @@ Session = sessionmaker()
 
 def extract(
     url: str = "http://rest.kegg.jp/get/",
-    requests_per_second: int = 10,
-) -> DataFrame:
+    requests_per_second: float = 10,
+    max_concurrency: int = 10,
+    batch_size: int = 10,
+    store: Optional[KEGGResponseStore] = None,
+    manifest: Optional[Path] = None,
+    refresh_changed: bool = False,
+    session: Optional[Session] = None,
+    connect_timeout: float = 10,
+    read_timeout: float = 60,
+    max_retries: int = 5,
+    shared_bucket: Optional[SharedTokenBucket] = None,
+) -> Iterator[KEGGResponseModel]:
     """
     Fetch MDL MOL blocks from KEGG for compounds without InChI.
 
+    By default, the MOL blocks of all entries in the KEGG compound, glycan, drug,
+    and environ databases are fetched. Given a database session, only the entries
+    annotated on compounds that are missing an InChI are fetched instead.
+
     Parameters
     ----------
     url : str, optional
         The URL to query for the KEGG compounds.
-    requests_per_second : int, optional
+    requests_per_second : float, optional
         The desired requests per second to make. The default of 10 is the desired limit
         by KEGG.
+    max_concurrency : int, optional
+        The maximum number of requests in flight at any time (default 10).
+    batch_size : int, optional
+        The number of entries to retrieve with a single request (default 10). KEGG
+        allows at most 10.
+    store : KEGGResponseStore, optional
+        A response store to which responses are written as soon as they are received.
+        Identifiers with a final response in the store are not requested again, which
+        allows resuming an interrupted download.
+    manifest : pathlib.Path, optional
+        The path of a manifest that records the KEGG release and the list
+        descriptions of the entries as of their last fetch. It is compared with the
+        current state of KEGG and updated after every run. A description is only
+        advanced once its entry has been fetched again.
+    refresh_changed : bool, optional
+        Whether to request entries again whose list description has changed since
+        the previous run recorded in the manifest (default false).
+    session : sqlalchemy.orm.session.Session, optional
+        An active session in order to communicate with a SQL database. If given,
+        only the KEGG identifiers of its compounds without an InChI are requested,
+        the most referenced compounds first. The manifest is neither consulted nor
+        updated in this case since the selection is not complete.
+    connect_timeout : float, optional
+        The number of seconds to wait for establishing a connection (default 10).
+    read_timeout : float, optional
+        The number of seconds to wait for receiving data (default 60).
+    max_retries : int, optional
+        The maximum number of repetitions of a request after network errors, time
+        outs, or server errors (default 5). Identifiers whose requests still fail are
+        recorded with their last status code, or zero without any response.
+    shared_bucket : SharedTokenBucket, optional
+        A token bucket shared by concurrent processes on the same host. Requests
+        additionally draw from it such that the combined rate of all processes is
+        limited.
 
     Returns
     -------
-    pandas.DataFrame
-        A data frame with two columns, the compound index and its corresponding KEGG
-        identifier.
+    iterator
+        The KEGG REST API responses, one per compound identifier. Responses are read
+        lazily from the store if one is given.
 
     """
-    loop = asyncio.get_event_loop()
-    identifiers = set()
-    for db, prefix in [
-        ("compound", "cpd:"),
-        ("glycan", "gl:"),
-        ("drug", "dr:"),
-        ("environ", "ev:"),
-    ]:
-        text = loop.run_until_complete(fetch_kegg_list(db))
-        df = read_csv(
-            text, sep="\t", header=None, index_col=False, names=["id", "description"]
-        )
-        # We strip the prefix from the identifiers and use only unique occurrences.
-        identifiers.update(df["id"].str[len(prefix) :].unique())
-    data = loop.run_until_complete(
-        fetch_kegg_resources(
-            identifiers, kegg_mol_fetcher, url, requests_per_second=requests_per_second
-        )
+    return extract_kegg_resources(
+        ["compound", "glycan", "drug", "environ"],
+        kegg_mol_fetcher,
+        split_kegg_mol_blocks,
+        url,
+        requests_per_second=requests_per_second,
+        max_concurrency=max_concurrency,
+        batch_size=batch_size,
+        store=store,
+        manifest=manifest,
+        refresh_changed=refresh_changed,
+        targets=None if session is None else _select_missing_inchi(session),
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        max_retries=max_retries,
+        shared_bucket=shared_bucket,
+    )
+
+
+def _query_missing_inchi(session: Session, *columns: Any) -> Query:
+    """Return a query for KEGG annotations of compounds that are missing an InChI."""
+    return (
+        session.query(*columns)
+        .select_from(Compound)
+        .join(CompoundAnnotation)
+        .join(Namespace)
+        .filter(Namespace.prefix.like("kegg%"))
+        .filter(Compound.inchi.is_(None))
     )
-    loop.close()
-    return data
+
+
+def _select_missing_inchi(session: Session) -> List[str]:
+    """Return the KEGG identifiers of compounds without InChI, most referenced first."""
+    num_reactions = func.count(distinct(Participant.reaction_id))
+    query = (
+        _query_missing_inchi(session, CompoundAnnotation.identifier, num_reactions)
+        .outerjoin(Participant, Participant.compound_id == Compound.id)
+        .group_by(CompoundAnnotation.identifier)
+        .order_by(num_reactions.desc(), CompoundAnnotation.identifier)
+    )
+    identifiers = [row.identifier for row in query]
+    logger.info(
+        f"There are {len(identifiers)} KEGG identifiers of compounds that are "
+        f"missing an InChI string."
+    )
+    return identifiers
+
+
+def _mol_block_to_properties(
+    molecule_adapter: Type[AbstractMoleculeAdapter], mol_block: str
+) -> Union[Dict[str, Any], str]:
+    """Compute all structure properties of an MDL MOL block in a worker process."""
+    if molecule := molecule_adapter.from_mol_block(mol_block):
+        return molecule.compute_properties(PROPERTIES)
+    return "Failed to generate a molecule from MDL MOL block."
+
+
+def _hash_mol_block(mol_block: str) -> str:
+    """Return a digest of an MDL MOL block that ignores its header and whitespace."""
+    # The first three lines contain the name, program, timestamp, and a comment,
+    # none of which affect the structure. Anything shorter is not a valid MOL
+    # block and is hashed in full.
+    lines = mol_block.splitlines()
+    if len(lines) > 3:
+        lines = lines[3:]
+    normalized = "\n".join(line.rstrip() for line in lines).strip("\n")
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
 
 
 def transform(
-    response: str, molecule_adapter: Type[AbstractMoleculeAdapter]
-) -> Dict[str, str]:
+    responses: Iterable[KEGGResponseModel],
+    molecule_adapter: Type[AbstractMoleculeAdapter],
+    processes: int = 1,
+    chunk_size: int = 100,
+    cache: Optional[StructurePropertyCache] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, Dict[str, Any]]:
     """
     Transform the KEGG MDL MOL blocks to compound information.
 
+    All structure properties are computed from the molecule that is built from a
+    MOL block such that they need not be derived from the InChI later. MOL blocks
+    that are identical apart from their header are converted only once.
+
     Parameters
     ----------
-    response : str
-        The JSON collection of KEGG API responses containing MDL MOL blocks.
+    responses : iterable of KEGGResponseModel
+        The KEGG API responses containing MDL MOL blocks. They are consumed one by
+        one such that a generator keeps memory usage flat.
     molecule_adapter : AbstractMoleculeAdapter
+    processes : int, optional
+        The number of processes to distribute the conversion over (default 1).
+    chunk_size : int, optional
+        The number of MOL blocks sent to a worker process at a time (default 100).
+    cache : StructurePropertyCache, optional
+        An open cache that is consulted before converting a MOL block and that is
+        populated with all of its computed properties. It is keyed by the digest of
+        the MOL block without its header. MOL blocks recorded as failed in its
+        ledger are skipped unless it retries failures.
+    timeout : float, optional
+        The number of seconds that the conversion of a single MOL block may take.
+        If given, every MOL block is converted in an isolated worker process that is
+        killed and replaced when it exceeds the deadline. MOL blocks that exceed it
+        are reported and recorded in the cache's ledger.
 
     Returns
     -------
     dict
-        A map of KEGG reaction identifiers to names.
-
-    Raises
-    ------
-    pydantic.ValidationError
-        In case the JSON response data has an unexpected format.
+        A map of KEGG compound identifiers to structure records, that is, maps of
+        compound columns, for example, `inchi` and `mass`, to their values. The map
+        is identical, including its order, regardless of the number of processes.
 
     """
-    data = KEGGResponsesModel.parse_raw(response)
-    summarize_responses(data)
-    return {
-        response.identifier: inchi
-        for response in tqdm(data.__root__, desc="MOL Block")
-        if response.status_code == 200
-        and (molecule := molecule_adapter.from_mol_block(response.response))
-        and (inchi := molecule.get_inchi())
+    status_codes = Counter()
+
+    def successful() -> Iterator[KEGGResponseModel]:
+        """Count all status codes and only pass on successful responses."""
+        for response in responses:
+            status_codes[response.status_code] += 1
+            if response.status_code == 200:
+                yield response
+
+    # The adapter class is sent along by reference with every MOL block.
+    pool, compute = create_worker_map(
+        partial(_mol_block_to_properties, molecule_adapter),
+        processes=processes,
+        chunk_size=chunk_size,
+        timeout=timeout,
+        default=f"Exceeded the time limit of {timeout} s.",
+        crashed="The worker process died.",
+    )
+    id2structure = {}
+    # The results of the conversion of every distinct MOL block.
+    digest2structure = {}
+    num_blocks = 0
+    num_distinct = 0
+    offenders = []
+    # We process a bounded window of responses at a time such that they are not all
+    # read into memory at once.
+    window_size = processes * chunk_size * 4
+    pending = successful()
+    with pool, tqdm(desc="MOL Block") as pbar:
+        while window := list(islice(pending, window_size)):
+            digests = [_hash_mol_block(r.response) for r in window]
+            # Every distinct MOL block is converted once and its result is shared
+            # by all identifiers with the same MOL block.
+            distinct = {}
+            for digest, response in zip(digests, window):
+                if digest not in digest2structure:
+                    distinct.setdefault(digest, response.response)
+            if cache is None:
+                structures = compute(list(distinct.values()))
+            else:
+                # The cache is keyed by digest, in agreement with the deduplication,
+                # while the raw MOL blocks are converted.
+                structures = cache.get_or_compute(
+                    list(distinct), compute, list(distinct.values())
+                )
+            digest2structure.update(zip(distinct, structures))
+            num_blocks += len(window)
+            num_distinct += len(distinct)
+            for response, digest in zip(window, digests):
+                properties = digest2structure[digest]
+                # Failures are described by a string or missing from the cache.
+                if isinstance(properties, dict) and properties["inchi"]:
+                    id2structure[response.identifier] = properties
+            if timeout is not None and pool.offenders:
+                offending = set(pool.offenders)
+                pool.offenders.clear()
+                offenders.extend(
+                    r.identifier for r in window if r.response in offending
+                )
+            pbar.update(len(window))
+    if num_blocks > 0:
+        logger.info(
+            f"{num_distinct} distinct out of {num_blocks} MOL blocks were converted "
+            f"(deduplication ratio {1 - num_distinct / num_blocks:.2%})."
+        )
+    if offenders:
+        logger.warning(
+            f"The conversion of {len(offenders)} MOL block(s) exceeded the time limit "
+            f"of {timeout} s: {', '.join(offenders)}."
+        )
+    summarize_responses(status_codes)
+    return id2structure
+
+
+def _query_compounds(session: Session, criterion: Any) -> List[Compound]:
+    """Return all compounds matching the criterion with eagerly loaded relationships."""
+    return (
+        session.query(Compound)
+        .options(selectinload(Compound.annotation))
+        .options(selectinload(Compound.names))
+        .filter(criterion)
+        .all()
+    )
+
+
+def _collect_candidates(
+    session: Session,
+    builder: CompoundBuilder,
+    batch: Series,
+    mappings: List[Dict[str, Any]],
+) -> List[InChIConflict]:
+    """Extend the mappings by unambiguous InChIs and return conflicts of a batch."""
+    # Look up all existing compounds with any of the batch's InChIs at once. Several
+    # compounds may share the same InChI.
+    existing = {}
+    for compound in _query_compounds(
+        session,
+        Compound.inchi.in_({i for inchis in batch for i in inchis}),
+    ):
+        existing.setdefault(compound.inchi, []).append(compound)
+    conflicting = {}
+    for key, inchis in batch.items():
+        alternatives = [c for i in inchis for c in existing.get(i, [])]
+        # If the data is conflicting we do not try to resolve it but simply
+        # collect a report.
+        if len(alternatives) > 0 or len(inchis) > 1:
+            conflicting[int(key)] = (inchis, alternatives)
+            continue
+        # Apparently, `numpy.int` ends up as a BLOB in the database. We
+        # convert to native `int` here.
+        mappings.append({"id": int(key), "inchi": inchis[0]})
+    # We create information for detailed conflicts here.
+    compounds = {
+        compound.id: compound
+        for compound in _query_compounds(session, Compound.id.in_(list(conflicting)))
     }
+    return [
+        InChIConflict(
+            candidate_compound=builder.build_io(compounds[key]),
+            kegg_inchis=list(inchis),
+            existing_compounds=[builder.build_io(a) for a in alternatives],
+        )
+        for key, (inchis, alternatives) in conflicting.items()
+    ]
 
 
 def load(
     session: Session,
-    id2inchi: Dict[str, str],
+    id2structure: Dict[str, Union[Dict[str, Any], str]],
     batch_size: int = 1000,
+    streaming: bool = False,
 ) -> InChIConflictReport:
     """
-    Attempt to add InChI strings from KEGG to the database.
+    Attempt to add InChI strings and further structure information from KEGG.
+
+    The database is queried with a constant number of statements per batch of
+    compounds rather than per compound. Together with a new InChI, all other
+    structure columns that a compound is missing are written in the same bulk
+    update such that these compounds need not be converted again.
 
     Parameters
     ----------
     session : sqlalchemy.orm.session.Session
         An active session in order to communicate with a SQL database.
-    id2inchi : dict
-        A mapping from KEGG identifiers to InChI strings.
+    id2structure : dict
+        A mapping from KEGG identifiers to structure records as generated by
+        `transform`. Plain InChI strings are accepted, too, in which case only the
+        InChI is added.
     batch_size : int, optional
         The size of batches to proces the data in (default 1000). This can optimize
-        the speed to interact with the database.
+        the speed to interact with the database. In streaming mode, it is also the
+        number of rows read at a time.
+    streaming : bool, optional
+        Whether to stream the compounds ordered by their primary key such that memory
+        usage remains bounded (default False).
 
     """
+    inchi2structure = {}
+    id2inchi = {}
+    for identifier, structure in id2structure.items():
+        if isinstance(structure, str):
+            structure = {"inchi": structure}
+        id2inchi[identifier] = structure["inchi"]
+        inchi2structure[structure["inchi"]] = structure
     # Fetch all compounds from the database that have KEGG identifiers and are
-    # missing their InChI string.
-    query = (
-        session.query(Compound.id, CompoundAnnotation.identifier)
-        .select_from(Compound)
-        .join(CompoundAnnotation)
-        .join(Namespace)
-        .filter(Namespace.prefix.like("kegg%"))
-        .filter(Compound.inchi.is_(None))
-    )
-    df = read_sql_query(query.statement, session.bind)
-    # The resulting data frame will contain duplicate compound primary keys.
-    primary_keys = df["id"].unique()
+    # missing their InChI string together with their other structure columns.
+    fields = [f for f in PROPERTIES if f != "inchi"]
+    query = _query_missing_inchi(
+        session,
+        Compound.id,
+        CompoundAnnotation.identifier,
+        *[getattr(Compound, f) for f in fields],
+    ).order_by(Compound.id)
+    builder = CompoundBuilder(namespaces=Namespace.get_map(session))
+    num_compounds = 0
+    conflicts = []
+    mappings = []
+    # The structure columns that each candidate compound is missing.
+    missing = {}
+    with tqdm(desc="Compound", unit_scale=True) as pbar:
+        # The data frames will contain duplicate compound primary keys.
+        for df in read_query_frames(session, query, batch_size, streaming):
+            num_compounds += df["id"].nunique()
+            # We collect the unique KEGG InChIs of each compound in one go.
+            df["inchi"] = df["identifier"].map(id2inchi)
+            df = df.dropna(subset=["inchi"])
+            for row in df.drop_duplicates("id").itertuples(index=False):
+                missing[int(row.id)] = [f for f in fields if pd.isna(getattr(row, f))]
+            candidates = df.groupby("id", sort=False)["inchi"].unique()
+            for index in range(0, len(candidates), batch_size):
+                batch = candidates.iloc[index : index + batch_size]
+                conflicts.extend(_collect_candidates(session, builder, batch, mappings))
+                pbar.update(len(batch))
     logger.info(
-        f"There are {len(primary_keys)} compounds with KEGG identifiers that are "
+        f"There are {num_compounds} compounds with KEGG identifiers that are "
         f"missing an InChI string."
     )
-    grouped_df = df.groupby("id", sort=False)
-    builder = CompoundBuilder(namespaces=Namespace.get_map(session))
-    conflicts = []
-    with tqdm(total=len(primary_keys), desc="Compound", unit_scale=True) as pbar:
-        for index in range(0, len(primary_keys), batch_size):
-            mappings = []
-            batch = primary_keys[index : index + batch_size]
-            for key in batch:
-                sub = grouped_df.get_group(key)
-                inchis = {
-                    inchi
-                    for kegg_id in sub["identifier"]
-                    if (inchi := id2inchi.get(kegg_id, None))
-                }
-                if not inchis:
-                    continue
-                # We create information for detailed conflicts here.
-                conflict = InChIConflict(
-                    candidate_compound=builder.build_io(
-                        session.query(Compound)
-                        .options(selectinload(Compound.annotation))
-                        .options(selectinload(Compound.names))
-                        .filter(Compound.id == int(key))
-                        .one()
-                    ),
-                    kegg_inchis=list(inchis),
-                    existing_compounds=[],
-                )
-                for inchi in inchis:
-                    alternative = (
-                        session.query(Compound)
-                        .options(selectinload(Compound.annotation))
-                        .options(selectinload(Compound.names))
-                        .filter(Compound.inchi == inchi)
-                        .one_or_none()
-                    )
-                    if alternative:
-                        conflict.existing_compounds.append(
-                            builder.build_io(alternative)
-                        )
-                # If the data is conflicting we do not try to resolve it but simply
-                # collect a report.
-                if len(conflict.existing_compounds) > 0 or len(inchis) > 1:
-                    conflicts.append(conflict)
-                    continue
-                # We are certain here that `inchis` is a set with one element.
-                inchi = inchis.pop()
-                mappings.append({"id": int(key), "inchi": inchi})
-            pbar.update(len(batch))
     logger.info(f"There are {len(mappings)} potentially new InChIs from KEGG.")
     inchi_hist = Counter((m["inchi"] for m in mappings))
-    updates = [m for m in mappings if inchi_hist[m["inchi"]] == 1]
+    updates = []
+    for mapping in mappings:
+        if inchi_hist[mapping["inchi"]] > 1:
+            continue
+        structure = inchi2structure[mapping["inchi"]]
+        updates.append(
+            {
+                **mapping,
+                **{f: structure[f] for f in missing[mapping["id"]] if f in structure},
+            }
+        )
     session.bulk_update_mappings(Compound, updates)
     session.commit()
-    logger.info(f"{len(updates)} additional InChI strings were added from KEGG.")
+    logger.info(
+        f"{len(updates)} additional InChI strings and their structure information "
+        f"were added from KEGG."
+    )
+    duplicate_mappings = [m for m in mappings if inchi_hist[m["inchi"]] > 1]
     duplicates = {}
-    for mapping in mappings:
-        inchi = mapping["inchi"]
-        if inchi_hist[inchi] > 1:
-            duplicates.setdefault(inchi, []).append(
-                builder.build_io(
-                    session.query(Compound)
-                    .options(selectinload(Compound.annotation))
-                    .options(selectinload(Compound.names))
-                    .filter(Compound.id == mapping["id"])
-                    .one()
-                )
+    for index in range(0, len(duplicate_mappings), batch_size):
+        batch = duplicate_mappings[index : index + batch_size]
+        compounds = {
+            compound.id: compound
+            for compound in _query_compounds(
+                session, Compound.id.in_([m["id"] for m in batch])
+            )
+        }
+        for mapping in batch:
+            duplicates.setdefault(mapping["inchi"], []).append(
+                builder.build_io(compounds[mapping["id"]])
             )
     logger.info(f"There are {len(duplicates)} InChIs with duplicates in KEGG.")
     logger.info(f"There are {len(conflicts)} conflicts.")
@@ -17,13 +17,22 @@
 
 
 import logging
-from typing import Type
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
 
 from cobra_component_models.orm import Compound
-from sqlalchemy import or_
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Column, and_, or_
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Query, sessionmaker
+from sqlalchemy.sql import ColumnElement
 from tqdm import tqdm
 
+from ...etl import (
+    StructurePropertyCache,
+    create_worker_map,
+    parse_inchi_formula_and_charge,
+)
 from ...model import AbstractMoleculeAdapter
 
 
@@ -36,10 +45,91 @@ logger = logging.getLogger(__name__)
 Session = sessionmaker()
 
 
+# The compound columns that can be computed from a molecule.
+PROPERTIES = tuple(AbstractMoleculeAdapter.properties)
+
+
+# The compound columns that can be read directly from the layers of an InChI.
+INCHI_LAYER_PROPERTIES = ("chemical_formula", "charge")
+
+
+def _compute_properties(
+    molecule_adapter: Type[AbstractMoleculeAdapter],
+    args: Tuple[Optional[str], Optional[str], Tuple[str, ...]],
+) -> Union[Dict[str, Any], str]:
+    """
+    Compute the given properties from an InChI or SMILES in a worker process.
+
+    Return the reason as a string if the properties could not be computed.
+
+    """
+    inchi, smiles, fields = args
+    # Structures with unknown chemical groups are already excluded by the query.
+    if inchi:
+        molecule = molecule_adapter.from_inchi(inchi)
+        kind = "InChI"
+    elif smiles:
+        molecule = molecule_adapter.from_smiles(smiles)
+        kind = "SMILES"
+    else:
+        logger.error(
+            "Wrong SQL query statement, this condition should be impossible to reach."
+        )
+        return "Neither InChI nor SMILES given."
+    if not molecule:
+        return f"Failed to generate a molecule from {kind}."
+    return molecule.compute_properties(fields)
+
+
+def _is_known(column: Column) -> ColumnElement:
+    """Return a criterion for a structure without unknown chemical groups."""
+    return and_(
+        column.isnot(None),
+        column.notlike("%*%"),
+        column.notlike("%Zz%"),
+    )
+
+
+def _read_inchi_layers(
+    inchi: Optional[str], fields: Tuple[str, ...], properties: Tuple[str, ...]
+) -> Dict[str, Any]:
+    """Return the missing properties that can be read from an InChI directly."""
+    # Only the properties that agree with the backend's own values are read.
+    fields = tuple(f for f in fields if f in properties)
+    if (
+        not inchi
+        or not any(f in INCHI_LAYER_PROPERTIES for f in fields)
+        or (parsed := parse_inchi_formula_and_charge(inchi)) is None
+    ):
+        return {}
+    return {
+        field: value
+        for field, value in zip(INCHI_LAYER_PROPERTIES, parsed)
+        if field in fields
+    }
+
+
+def _next_page(query: Query, last_id: int, size: int) -> List[Row]:
+    """Return the page of rows that follows the given primary key."""
+    return query.filter(Compound.id > last_id).order_by(Compound.id).limit(size).all()
+
+
+def _write_checkpoint(checkpoint: Path, last_id: int) -> None:
+    """Atomically record the primary key of the last processed compound."""
+    tmp = checkpoint.with_name(f"{checkpoint.name}.tmp")
+    tmp.write_text(str(last_id))
+    tmp.replace(checkpoint)
+
+
 def augment_information(
     session: Session,
     molecule_adapter: Type[AbstractMoleculeAdapter],
     batch_size: int = 1000,
+    processes: int = 1,
+    chunk_size: int = 100,
+    checkpoint: Optional[Path] = None,
+    cache: Optional[StructurePropertyCache] = None,
+    timeout: Optional[float] = None,
 ) -> None:
     """
     Attempt to fill in missing structural information using chem-informatics software.
@@ -51,12 +141,34 @@ def augment_information(
     molecule_adapter : AbstractMoleculeAdapter
     batch_size : int, optional
         The size of batches of compounds considered at a time (default 1000).
+    processes : int, optional
+        The number of processes to distribute the computation over (default 1).
+    chunk_size : int, optional
+        The number of compounds sent to a worker process at a time (default 100).
+    checkpoint : pathlib.Path, optional
+        A file in which the primary key of the last processed compound is recorded
+        after every committed batch. If it exists, processing resumes after that
+        compound. The file is removed once all compounds have been processed.
+    cache : StructurePropertyCache, optional
+        An open cache that is consulted before converting a compound's InChI or
+        SMILES string and that is populated with the results. Structures recorded
+        as failed in its ledger are skipped unless it retries failures.
+    timeout : float, optional
+        The number of seconds that the computation for a single compound may take.
+        If given, every compound is handled in an isolated worker process that is
+        killed and replaced when it exceeds the deadline. Compounds that exceed it
+        are reported and recorded in the cache's ledger.
 
     """
-    # We retrieve all compounds that either have an InChI or a SMILES description and
-    # are missing at least one other piece of structural information.
-    query = session.query(Compound).filter(
-        or_(Compound.inchi.isnot(None), Compound.smiles.isnot(None)),
+    # We retrieve only the columns of all compounds that either have an InChI or a
+    # SMILES description and are missing at least one other piece of structural
+    # information. We refuse to convert unknown chemical groups to molecules.
+    columns = [getattr(Compound, field) for field in PROPERTIES]
+    query = session.query(Compound.id, *columns).filter(
+        or_(
+            _is_known(Compound.inchi),
+            and_(Compound.inchi.is_(None), _is_known(Compound.smiles)),
+        ),
         or_(
             Compound.inchi_key.is_(None),
             Compound.chemical_formula.is_(None),
@@ -64,51 +176,80 @@ def augment_information(
             Compound.charge.is_(None),
         ),
     )
-    num_compounds = query.count()
-    for compound in tqdm(
-        query.yield_per(batch_size),
-        total=num_compounds,
-        desc="Compound",
-        unit_scale=True,
-    ):  # type: Compound
-        if compound.inchi:
-            logger.debug(compound.inchi)
-            if "*" in compound.inchi or "Zz" in compound.inchi:
-                logger.debug(
-                    "Refusing to convert unknown chemical groups to molecule."
+    # Primary keys are positive integers.
+    last_id = 0
+    if checkpoint is not None and checkpoint.exists():
+        last_id = int(checkpoint.read_text())
+        logger.info(f"Resuming after compound {last_id}.")
+    num_compounds = query.filter(Compound.id > last_id).count()
+    # The adapter class is sent along by reference with every compound.
+    pool, compute = create_worker_map(
+        partial(_compute_properties, molecule_adapter),
+        processes=processes,
+        chunk_size=chunk_size,
+        timeout=timeout,
+        default=f"Exceeded the time limit of {timeout} s.",
+        crashed="The worker process died.",
+    )
+    offenders = []
+    with pool, tqdm(total=num_compounds, desc="Compound", unit_scale=True) as pbar:
+        # We page through the compounds by primary key rather than by offset such
+        # that every page is a cheap index range scan and work can be committed in
+        # between.
+        while batch := _next_page(query, last_id, batch_size):
+            mappings = []
+            # Compounds that need a toolkit for some of their missing properties.
+            pending = []
+            for row in batch:
+                missing = tuple(f for f in PROPERTIES if not getattr(row, f))
+                mapping = {
+                    "id": row.id,
+                    **_read_inchi_layers(
+                        row.inchi, missing, molecule_adapter.inchi_layer_properties
+                    ),
+                }
+                if remaining := tuple(f for f in missing if f not in mapping):
+                    pending.append((row, remaining, mapping))
+                elif len(mapping) > 1:
+                    mappings.append(mapping)
+            if cache is None:
+                # Only the missing properties of each compound are computed.
+                results = compute(
+                    [(row.inchi, row.smiles, fields) for row, fields, _ in pending]
+                )
+            else:
+                # Cached entries contain all properties such that they can serve any
+                # combination of missing ones.
+                results = cache.get_or_compute(
+                    [row.inchi or row.smiles for row, *_ in pending],
+                    compute,
+                    [(row.inchi, row.smiles, PROPERTIES) for row, *_ in pending],
                 )
-                continue
-            molecule = molecule_adapter.from_inchi(compound.inchi)
-            if not molecule:
-                continue
-        elif compound.smiles:
-            logger.debug(compound.smiles)
-            if "*" in compound.smiles or "Zz" in compound.smiles:
-                logger.debug(
-                    "Refusing to convert unknown chemical groups to molecule."
+            for (_, fields, mapping), properties in zip(pending, results):
+                if isinstance(properties, dict):
+                    mapping.update((f, properties[f]) for f in fields)
+                if len(mapping) > 1:
+                    mappings.append(mapping)
+            if timeout is not None and pool.offenders:
+                offending = {job[:2] for job in pool.offenders}
+                pool.offenders.clear()
+                offenders.extend(
+                    row.id
+                    for row, *_ in pending
+                    if (row.inchi, row.smiles) in offending
                 )
-                continue
-            molecule = molecule_adapter.from_smiles(compound.smiles)
-            if not molecule:
-                continue
-        else:
-            logger.error(
-                "Wrong SQL query statement, this condition should be "
-                "impossible to reach."
-            )
-            continue
-        if not compound.inchi:
-            compound.inchi = molecule.get_inchi()
-        if not compound.inchi_key:
-            compound.inchi_key = molecule.get_inchi_key()
-        if not compound.smiles:
-            compound.smiles = molecule.get_smiles()
-        if not compound.chemical_formula:
-            compound.chemical_formula = molecule.get_chemical_formula()
-        if not compound.mass:
-            compound.mass = molecule.get_molecular_mass()
-        if not compound.charge:
-            compound.charge = molecule.get_charge()
-    # Keeping the commit out of the loop here assumes that the session can keep all
-    # modified objects in memory.
-    session.commit()
+            session.bulk_update_mappings(Compound, mappings)
+            # Since only column values are queried, the session's identity map does
+            # not grow and need not be expunged.
+            session.commit()
+            last_id = batch[-1].id
+            if checkpoint is not None:
+                _write_checkpoint(checkpoint, last_id)
+            pbar.update(len(batch))
+    if offenders:
+        logger.warning(
+            f"The computation for {len(offenders)} compound(s) exceeded the time "
+            f"limit of {timeout} s: {', '.join(map(str, offenders))}."
+        )
+    if checkpoint is not None and checkpoint.exists():
+        checkpoint.unlink()
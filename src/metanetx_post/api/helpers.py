@@ -16,16 +16,57 @@
 """Populate compound information."""
 
 
+import asyncio
+import gzip
 import logging
+import re
 from collections import Counter
+from contextlib import nullcontext
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Coroutine,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+)
 
 import httpx
-from sqlalchemy.orm import sessionmaker
+import pandas as pd
+from sqlalchemy.orm import Query, sessionmaker
 
-from ..model import BiGGVersionModel, KEGGResponsesModel
+from ..etl import (
+    KEGGResponseStore,
+    SharedTokenBucket,
+    fetch_kegg_entries,
+    fetch_kegg_resources,
+)
+from ..model import (
+    BiGGVersionModel,
+    KEGGManifestModel,
+    KEGGResponseModel,
+    KEGGResponsesModel,
+)
 
 
-__all__ = ("fetch_kegg_info", "fetch_bigg_info", "summarize_responses")
+__all__ = (
+    "fetch_kegg_info",
+    "fetch_bigg_info",
+    "summarize_responses",
+    "read_kegg_responses",
+    "write_kegg_responses",
+    "get_kegg_release",
+    "select_kegg_identifiers",
+    "update_kegg_manifest",
+    "extract_kegg_resources",
+    "read_query_frames",
+)
 
 
 logger = logging.getLogger(__name__)
@@ -41,6 +82,14 @@ def fetch_kegg_info() -> str:
     return response.text
 
 
+def get_kegg_release(info: str) -> str:
+    """Return the release statement from the KEGG database version information."""
+    match = re.search(r"Release[^\n]*", info)
+    if match is None:
+        return info.strip()
+    return match.group(0)
+
+
 def fetch_bigg_info() -> BiGGVersionModel:
     """Fetch the BiGG database version information."""
     response = httpx.get("http://bigg.ucsd.edu/api/v2/database_version")
@@ -50,8 +99,348 @@ def fetch_bigg_info() -> BiGGVersionModel:
     return BiGGVersionModel.parse_raw(response.text)
 
 
-def summarize_responses(responses: KEGGResponsesModel) -> None:
+def summarize_responses(status_codes: Counter) -> None:
+    """Log the distribution of HTTP response status codes."""
     logger.info("HTTP responses status code summary:")
-    summary = Counter(response.status_code for response in responses.__root__)
-    for code, num in summary.items():
-        logger.info(f"{code}: {num} ({num / len(responses.__root__):.2%})")
+    total = sum(status_codes.values())
+    for code, num in status_codes.items():
+        logger.info(f"{code}: {num} ({num / total:.2%})")
+
+
+def _open_text(path: Path, mode: str) -> TextIO:
+    """Open a plain or gzip-compressed text file."""
+    if path.suffix == ".gz":
+        return gzip.open(path, f"{mode}t")
+    return path.open(mode)
+
+
+def read_kegg_responses(path: Path) -> Iterator[KEGGResponseModel]:
+    """
+    Yield KEGG REST API responses one by one from a file.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        A JSON Lines file with one response per line or, for backwards compatibility,
+        a JSON array of responses. Files ending in '.gz' are decompressed.
+
+    Raises
+    ------
+    pydantic.ValidationError
+        In case the JSON response data has an unexpected format.
+
+    """
+    with _open_text(path, "r") as handle:
+        first = handle.read(1)
+        while first.isspace():
+            first = handle.read(1)
+        handle.seek(0)
+        if first == "[":
+            # A JSON array cannot be parsed incrementally so we load it at once.
+            yield from KEGGResponsesModel.parse_raw(handle.read()).__root__
+            return
+        for line in handle:
+            if line.strip():
+                yield KEGGResponseModel.parse_raw(line)
+
+
+def write_kegg_responses(responses: Iterable[KEGGResponseModel], path: Path) -> None:
+    """
+    Write KEGG REST API responses one by one to a file.
+
+    Parameters
+    ----------
+    responses : iterable of KEGGResponseModel
+        The responses to write.
+    path : pathlib.Path
+        The output file. Files with a '.jsonl' suffix are written in JSON Lines
+        format, all others as a JSON array. Files ending in '.gz' are compressed.
+
+    """
+    with _open_text(path, "w") as handle:
+        if ".jsonl" in path.suffixes:
+            for response in responses:
+                handle.write(response.json(separators=(",", ":")))
+                handle.write("\n")
+        else:
+            handle.write("[")
+            for index, response in enumerate(responses):
+                if index > 0:
+                    handle.write(",")
+                handle.write(response.json(separators=(",", ":")))
+            handle.write("]")
+
+
+def select_kegg_identifiers(
+    entries: Dict[str, str],
+    release: str,
+    store: Optional[KEGGResponseStore] = None,
+    manifest: Optional[KEGGManifestModel] = None,
+    refresh_changed: bool = False,
+) -> List[str]:
+    """
+    Select the KEGG identifiers whose entries need to be requested.
+
+    Parameters
+    ----------
+    entries : dict
+        The current map from KEGG identifiers to their list descriptions.
+    release : str
+        The current KEGG release.
+    store : KEGGResponseStore, optional
+        The response store of previous runs. Identifiers with a final response in the
+        store are not selected unless they changed.
+    manifest : KEGGManifestModel, optional
+        The state of KEGG at the time of the previous complete run.
+    refresh_changed : bool, optional
+        Whether to select previously fetched entries whose list description has
+        changed since the previous run (default false).
+
+    Returns
+    -------
+    list
+        The selected KEGG identifiers.
+
+    """
+    if store is None:
+        return list(entries)
+    fetched = store.fetched()
+    identifiers = [i for i in entries if i not in fetched]
+    logger.info(
+        f"{len(identifiers)} of {len(entries)} KEGG entries have not been fetched yet."
+    )
+    if manifest is None:
+        return identifiers
+    logger.info(f"Comparing KEGG {release} with the previous {manifest.release}.")
+    removed = manifest.entries.keys() - entries.keys()
+    logger.info(f"{len(removed)} KEGG entries were removed since the previous run.")
+    changed = [
+        i
+        for i, description in entries.items()
+        if i in fetched and manifest.entries.get(i, description) != description
+    ]
+    logger.info(f"{len(changed)} KEGG entries have a changed description.")
+    if refresh_changed:
+        identifiers.extend(changed)
+    return identifiers
+
+
+def update_kegg_manifest(
+    entries: Dict[str, str],
+    release: str,
+    fetched: Collection[str],
+    manifest: Optional[KEGGManifestModel] = None,
+) -> KEGGManifestModel:
+    """
+    Return the manifest that records the state of KEGG after a run.
+
+    Parameters
+    ----------
+    entries : dict
+        The current map from KEGG identifiers to their list descriptions.
+    release : str
+        The current KEGG release.
+    fetched : collection of str
+        The identifiers whose entries received a final response in this run. Only
+        their descriptions are advanced to the current ones. Any other entry keeps
+        its previous description such that a change is detected again by later
+        runs until the entry is fetched again.
+    manifest : KEGGManifestModel, optional
+        The state of KEGG at the time of the previous run.
+
+    Returns
+    -------
+    KEGGManifestModel
+        The new manifest. Entries that were removed from KEGG are dropped.
+
+    """
+    previous = {} if manifest is None else manifest.entries
+    kept = {i: previous.get(i, d) for i, d in entries.items() if i not in fetched}
+    return KEGGManifestModel(release=release, entries={**entries, **kept})
+
+
+def extract_kegg_resources(
+    databases: Iterable[str],
+    fetcher: Callable[[str, httpx.AsyncClient], Coroutine[Any, Any, httpx.Response]],
+    splitter: Callable[[Sequence[str], str], Dict[str, str]],
+    url: str = "http://rest.kegg.jp/get/",
+    requests_per_second: float = 10,
+    max_concurrency: int = 10,
+    batch_size: int = 10,
+    store: Optional[KEGGResponseStore] = None,
+    manifest: Optional[Path] = None,
+    refresh_changed: bool = False,
+    targets: Optional[Iterable[str]] = None,
+    merge_targets: bool = False,
+    connect_timeout: float = 10,
+    read_timeout: float = 60,
+    max_retries: int = 5,
+    shared_bucket: Optional[SharedTokenBucket] = None,
+) -> Iterator[KEGGResponseModel]:
+    """
+    Fetch the entries of KEGG databases, incrementally if possible.
+
+    Parameters
+    ----------
+    databases : iterable of str
+        The KEGG databases whose entries are fetched, for example, `reaction`.
+    fetcher : callable
+        Called with KEGG identifiers and an httpx.AsyncClient instance in order to
+        request their entries, see `etl.fetch_kegg_resources`.
+    splitter : callable
+        Maps the response of a batch of identifiers to their individual entries.
+    url : str, optional
+        The URL to query for the KEGG entries.
+    requests_per_second : float, optional
+        The desired requests per second to make (default 10).
+    max_concurrency : int, optional
+        The maximum number of requests in flight at any time (default 10).
+    batch_size : int, optional
+        The number of entries to retrieve with a single request (default 10).
+    store : KEGGResponseStore, optional
+        A response store to which responses are written as soon as they are received.
+        Identifiers with a final response in the store are not requested again.
+    manifest : pathlib.Path, optional
+        The path of a manifest that records the KEGG release and the list
+        descriptions of the entries as of their last fetch. It is compared with the
+        current state of KEGG and updated after every run. A description is only
+        advanced once its entry has been fetched again.
+    refresh_changed : bool, optional
+        Whether to request entries again whose list description has changed since
+        the previous run recorded in the manifest (default false).
+    targets : iterable of str, optional
+        If given, only these identifiers are requested, in order, rather than all
+        entries of the databases. The manifest is neither consulted nor updated in
+        this case since the selection is not complete.
+    merge_targets : bool, optional
+        Whether to return the responses for all identifiers in the store rather than
+        only for the targets (default false).
+    connect_timeout : float, optional
+        The number of seconds to wait for establishing a connection (default 10).
+    read_timeout : float, optional
+        The number of seconds to wait for receiving data (default 60).
+    max_retries : int, optional
+        The maximum number of repetitions of a request after transient failures
+        (default 5).
+    shared_bucket : SharedTokenBucket, optional
+        A token bucket shared by concurrent processes on the same host.
+
+    Returns
+    -------
+    iterator
+        The KEGG REST API responses, one per identifier. Responses are read lazily
+        from the store if one is given.
+
+    """
+    # A loop of our own is closed afterwards without affecting any other user.
+    loop = asyncio.new_event_loop()
+    try:
+        if targets is not None:
+            # A dictionary keeps the order of the identifiers and, unlike a list,
+            # allows constant time look-ups when reading the responses from the
+            # store.
+            entries = dict.fromkeys(targets, "")
+            identifiers = select_kegg_identifiers(entries, "", store)
+        else:
+            entries = loop.run_until_complete(fetch_kegg_entries(databases))
+            release = get_kegg_release(fetch_kegg_info())
+            previous = None
+            if manifest is not None and manifest.exists():
+                previous = KEGGManifestModel.parse_file(manifest)
+            identifiers = select_kegg_identifiers(
+                entries, release, store, previous, refresh_changed
+            )
+        with store or nullcontext(), shared_bucket or nullcontext():
+            data = loop.run_until_complete(
+                fetch_kegg_resources(
+                    identifiers,
+                    fetcher,
+                    url,
+                    requests_per_second=requests_per_second,
+                    max_concurrency=max_concurrency,
+                    batch_size=batch_size,
+                    splitter=splitter,
+                    store=store,
+                    connect_timeout=connect_timeout,
+                    read_timeout=read_timeout,
+                    max_retries=max_retries,
+                    shared_bucket=shared_bucket,
+                )
+            )
+    finally:
+        loop.close()
+    if manifest is not None and targets is None:
+        if store is None:
+            is_final = data["status_code"].isin(KEGGResponseStore.final_status_codes)
+            fetched = set(data.loc[is_final, "identifier"])
+        else:
+            # The latest response of every requested identifier is from this run.
+            fetched = store.fetched().intersection(identifiers)
+        manifest.write_text(
+            update_kegg_manifest(entries, release, fetched, previous).json()
+        )
+    if store is not None:
+        # Entries that were removed from KEGG since a previous run are dropped.
+        return store.iter_responses(None if merge_targets else entries)
+    return (
+        KEGGResponseModel(
+            identifier=row.identifier,
+            status_code=row.status_code,
+            response=row.response,
+        )
+        for row in data.itertuples(index=False)
+    )
+
+
+def read_query_frames(
+    session: Session,
+    query: Query,
+    batch_size: int = 1000,
+    streaming: bool = False,
+    key: str = "id",
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the results of a query as data frames.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.session.Session
+        An active session in order to communicate with a SQL database.
+    query : sqlalchemy.orm.Query
+        The query whose rows to read. In streaming mode, it must be ordered by the
+        `key` column.
+    batch_size : int, optional
+        The number of rows to read at a time in streaming mode (default 1000).
+    streaming : bool, optional
+        Whether to read all rows into a single data frame (default) or to stream
+        them with a server-side cursor such that memory usage remains bounded.
+        The cursor is opened on the session's own connection. Hence, the session
+        may write in between data frames but must not commit before they are
+        exhausted.
+    key : str, optional
+        The column whose rows are never split across data frames (default `id`).
+
+    """
+    if not streaming:
+        yield pd.read_sql_query(query.statement, session.bind)
+        return
+    # We read on the session's connection since writes from a second connection
+    # would be blocked by the open cursor, for example, on a SQLite database file.
+    result = (
+        session.connection()
+        .execution_options(stream_results=True)
+        .execute(query.statement)
+    )
+    columns = list(result.keys())
+    remainder = None
+    for rows in result.partitions(batch_size):
+        chunk = pd.DataFrame.from_records(rows, columns=columns)
+        if remainder is not None:
+            chunk = pd.concat([remainder, chunk], ignore_index=True)
+        # The rows of the last key may continue in the next partition.
+        is_last = chunk[key] == chunk[key].iat[-1]
+        remainder = chunk.loc[is_last]
+        if not is_last.all():
+            yield chunk.loc[~is_last].reset_index(drop=True)
+    if remainder is not None:
+        yield remainder.reset_index(drop=True)
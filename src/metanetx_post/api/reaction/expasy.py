@@ -21,18 +21,11 @@ import logging
 from pathlib import Path
 from typing import Collection, Dict, Set, Tuple
 
-import pandas as pd
-from cobra_component_models.orm import (
-    Namespace,
-    Reaction,
-    ReactionAnnotation,
-    ReactionName,
-)
 from rdflib import Graph
 from sqlalchemy.orm import sessionmaker
-from tqdm import tqdm
 
 from ...etl import collect_expasy_names, collect_expasy_obsoletes, fetch_expasy_rdf
+from .helpers import load_reaction_names
 
 
 __all__ = ()
@@ -88,6 +81,8 @@ def load(
     id2names: Dict[str, Collection[str]],
     obsoletes: Dict[str, str],
     batch_size: int = 1000,
+    vectorized: bool = True,
+    streaming: bool = False,
 ) -> None:
     """
     Load EC-code names into a database.
@@ -102,50 +97,20 @@ def load(
         A map of obsolete EC-codes to their replacements.
     batch_size : int, optional
         The size of batches to proces the data in.
+    vectorized : bool, optional
+        Whether to determine new names with set operations on the whole data frame
+        (default) or reaction by reaction.
+    streaming : bool, optional
+        Whether to stream the annotations ordered by reaction such that memory usage
+        remains bounded (default False).
 
     """
-    # Fetch all reactions from the database that have EC-codes.
-    ec_code_ns: Namespace = (
-        session.query(Namespace).filter(Namespace.prefix == "ec-code").one()
+    load_reaction_names(
+        session,
+        "ec-code",
+        id2names,
+        rewrite=lambda code: obsoletes.get(code, code),
+        batch_size=batch_size,
+        vectorized=vectorized,
+        streaming=streaming,
     )
-    query = (
-        session.query(Reaction.id, ReactionAnnotation.identifier, ReactionName.name)
-        .select_from(Reaction)
-        .join(ReactionAnnotation)
-        .join(ReactionName)
-        .join(Namespace)
-        .filter(Namespace.id == ec_code_ns.id)
-    )
-    df = pd.read_sql_query(query.statement, session.bind)
-    # Only unique names per reaction and namespace are allowed. Thus we group the
-    # data by reaction index so that we can later make the names unique.
-    grouped = df.groupby("id", as_index=False, sort=False)
-    reaction_ids = df["id"].unique()
-    with tqdm(total=len(reaction_ids), desc="Reaction", unit_scale=True) as pbar:
-        for index in range(0, len(reaction_ids), batch_size):
-            mappings = []
-            batch = reaction_ids[index : index + batch_size]
-            for rxn_id in batch:
-                sub = grouped.get_group(rxn_id)
-                # Check if any EC-code is obsolete and has a replacement.
-                ec_codes = [obsoletes.get(e, e) for e in sub["identifier"].unique()]
-                # Create unique names per reaction.
-                names = set()
-                for code in ec_codes:
-                    if labels := id2names.get(code, None):
-                        names.update(labels)
-                # Remove existing names.
-                names.difference_update(sub["name"].unique())
-                # Apparently, `numpy.int` ends up as a BLOB in the database. We
-                # convert to native `int` here.
-                mappings.extend(
-                    {
-                        "reaction_id": int(rxn_id),
-                        "namespace_id": ec_code_ns.id,
-                        "name": n,
-                    }
-                    for n in names
-                )
-            session.bulk_insert_mappings(ReactionName, mappings)
-            session.commit()
-            pbar.update(len(batch))
@@ -0,0 +1,316 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Provide helper functions for loading reaction information."""
+
+
+import logging
+from functools import partial
+from typing import Callable, Collection, Dict, List, Optional, Union
+
+import pandas as pd
+from cobra_component_models.orm import (
+    Namespace,
+    Reaction,
+    ReactionAnnotation,
+    ReactionName,
+)
+from sqlalchemy import and_, exists
+from sqlalchemy.orm import sessionmaker
+from tqdm import tqdm
+
+from ..helpers import read_query_frames
+
+
+__all__ = (
+    "load_reaction_names",
+    "collect_new_names",
+    "explode_names",
+    "insert_names",
+    "select_unnamed_identifiers",
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+Session = sessionmaker()
+
+
+def load_reaction_names(
+    session: Session,
+    prefix: str,
+    id2names: Dict[str, Union[str, Collection[str]]],
+    rewrite: Optional[Callable[[str], str]] = None,
+    batch_size: int = 1000,
+    vectorized: bool = True,
+    streaming: bool = False,
+) -> None:
+    """
+    Load reaction names from the namespace with the given prefix into a database.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.session.Session
+        An active session in order to communicate with a SQL database.
+    prefix : str
+        The prefix of the namespace whose reaction annotations are looked up and
+        whose names are loaded, for example, `kegg.reaction`.
+    id2names : dict
+        A map from identifiers to either a single name or a collection of names.
+    rewrite : callable, optional
+        A function that returns the identifier to use in place of a given one.
+    batch_size : int, optional
+        The number of rows to read at a time in streaming mode and the number of
+        names to insert at a time (default 1000).
+    vectorized : bool, optional
+        Whether to determine new names with set operations on the whole data frame
+        (default) or reaction by reaction.
+    streaming : bool, optional
+        Whether to stream the annotations ordered by reaction such that memory usage
+        remains bounded (default False).
+
+    """
+    namespace: Namespace = (
+        session.query(Namespace).filter(Namespace.prefix == prefix).one()
+    )
+    # Fetch all reactions that are annotated in the namespace together with any
+    # names that they already have in the same namespace.
+    query = (
+        session.query(Reaction.id, ReactionAnnotation.identifier, ReactionName.name)
+        .select_from(Reaction)
+        .join(ReactionAnnotation)
+        .outerjoin(
+            ReactionName,
+            and_(
+                ReactionName.reaction_id == Reaction.id,
+                ReactionName.namespace_id == namespace.id,
+            ),
+        )
+        .filter(ReactionAnnotation.namespace_id == namespace.id)
+        .order_by(Reaction.id)
+    )
+    if vectorized:
+        # The names are exploded once rather than for every streamed data frame.
+        collect = partial(collect_new_names, names=explode_names(id2names))
+    else:
+        collect = _collect_new_names_per_reaction
+    num_names = 0
+    with tqdm(desc="Reaction", unit_scale=True) as pbar:
+        for df in read_query_frames(session, query, batch_size, streaming):
+            names = collect(df, id2names, rewrite)
+            # A streaming cursor is invalidated by a commit so we commit only once
+            # all annotations have been read.
+            insert_names(
+                session, names, namespace.id, batch_size, commit=not streaming
+            )
+            num_names += len(names)
+            pbar.update(df["id"].nunique())
+    session.commit()
+    logger.info(f"{num_names} reaction names were added from '{prefix}'.")
+
+
+def _collect_new_names_per_reaction(
+    df: pd.DataFrame,
+    id2names: Dict[str, Union[str, Collection[str]]],
+    rewrite: Optional[Callable[[str], str]] = None,
+) -> pd.DataFrame:
+    """Determine the names that are new to each reaction one reaction at a time."""
+    # Only unique names per reaction and namespace are allowed. Thus we group the
+    # data by reaction index so that we can later make the names unique.
+    grouped = df.groupby("id", as_index=False, sort=False)
+    records = []
+    for rxn_id in df["id"].unique():
+        sub = grouped.get_group(rxn_id)
+        identifiers = sub["identifier"].unique()
+        if rewrite is not None:
+            identifiers = [rewrite(i) for i in identifiers]
+        # Create unique names per reaction.
+        names = set()
+        for identifier in identifiers:
+            labels = id2names.get(identifier, None)
+            if isinstance(labels, str):
+                names.add(labels)
+            elif labels:
+                names.update(labels)
+        # Remove existing names.
+        names.difference_update(sub["name"].unique())
+        records.extend((rxn_id, n) for n in names)
+    return pd.DataFrame.from_records(records, columns=["reaction_id", "name"])
+
+
+def explode_names(
+    id2names: Dict[str, Union[str, Collection[str]]]
+) -> pd.DataFrame:
+    """
+    Return a data frame with one row per identifier and name.
+
+    Parameters
+    ----------
+    id2names : dict
+        A map from identifiers to either a single name or a collection of names.
+
+    Returns
+    -------
+    pandas.DataFrame
+        A data frame with the columns `identifier` and `name`.
+
+    """
+    return (
+        pd.Series(id2names, dtype=object)
+        .explode()
+        .dropna()
+        .rename_axis("identifier")
+        .reset_index(name="name")
+    )
+
+
+def collect_new_names(
+    df: pd.DataFrame,
+    id2names: Dict[str, Union[str, Collection[str]]],
+    rewrite: Optional[Callable[[str], str]] = None,
+    names: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """
+    Determine the names that are new to each reaction using set operations.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        A data frame with the columns `id`, `identifier`, and `name` containing
+        reaction primary keys, their annotated identifiers, and existing names.
+    id2names : dict
+        A map from identifiers to either a single name or a collection of names.
+    rewrite : callable, optional
+        A function that returns the identifier to use in place of a given one, for
+        example, the replacement of an obsolete EC-code.
+    names : pandas.DataFrame, optional
+        The result of `explode_names` for `id2names`, which is computed if not
+        given. Passing it avoids repeating the work for every data frame.
+
+    Returns
+    -------
+    pandas.DataFrame
+        A data frame with the columns `reaction_id` and `name` containing every name
+        that is not yet associated with the reaction exactly once.
+
+    """
+    annotation = df[["id", "identifier"]].drop_duplicates()
+    if rewrite is not None:
+        annotation["identifier"] = annotation["identifier"].map(rewrite)
+    if names is None:
+        names = explode_names(id2names)
+    candidates = annotation.merge(names, on="identifier", how="inner")[
+        ["id", "name"]
+    ].drop_duplicates()
+    # Anti-join with the existing names.
+    merged = candidates.merge(
+        df[["id", "name"]].drop_duplicates(),
+        on=["id", "name"],
+        how="left",
+        indicator=True,
+    )
+    return (
+        merged.loc[merged["_merge"] == "left_only", ["id", "name"]]
+        .rename(columns={"id": "reaction_id"})
+        .reset_index(drop=True)
+    )
+
+
+def insert_names(
+    session: Session,
+    names: pd.DataFrame,
+    namespace_id: int,
+    batch_size: int = 1000,
+    commit: bool = True,
+) -> None:
+    """
+    Insert reaction names into the database in batches.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.session.Session
+        An active session in order to communicate with a SQL database.
+    names : pandas.DataFrame
+        A data frame with the columns `reaction_id` and `name`.
+    namespace_id : int
+        The primary key of the namespace that the names originate from.
+    batch_size : int, optional
+        The number of names to insert at a time (default 1000).
+    commit : bool, optional
+        Whether to commit after each batch (default) or to leave committing to the
+        caller.
+
+    """
+    for index in range(0, len(names), batch_size):
+        batch = names.iloc[index : index + batch_size]
+        # Apparently, `numpy.int` ends up as a BLOB in the database. We convert to
+        # native `int` here.
+        session.bulk_insert_mappings(
+            ReactionName,
+            [
+                {
+                    "reaction_id": int(rxn_id),
+                    "namespace_id": namespace_id,
+                    "name": name,
+                }
+                for rxn_id, name in zip(batch["reaction_id"], batch["name"])
+            ],
+        )
+        if commit:
+            session.commit()
+
+
+def select_unnamed_identifiers(session: Session, prefix: str) -> List[str]:
+    """
+    Select the identifiers annotated on reactions without names from a namespace.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.session.Session
+        An active session in order to communicate with a SQL database.
+    prefix : str
+        The prefix of the namespace whose reaction annotations and names are
+        considered, for example, `kegg.reaction`.
+
+    Returns
+    -------
+    list
+        The sorted, unique identifiers of all reactions that are annotated in the
+        namespace but do not have any name from it yet.
+
+    """
+    namespace: Namespace = (
+        session.query(Namespace).filter(Namespace.prefix == prefix).one()
+    )
+    named = exists().where(
+        and_(
+            ReactionName.reaction_id == ReactionAnnotation.reaction_id,
+            ReactionName.namespace_id == namespace.id,
+        )
+    )
+    query = (
+        session.query(ReactionAnnotation.identifier)
+        .filter(ReactionAnnotation.namespace_id == namespace.id)
+        .filter(~named)
+        .distinct()
+        .order_by(ReactionAnnotation.identifier)
+    )
+    identifiers = [row.identifier for row in query]
+    logger.info(
+        f"There are {len(identifiers)} '{prefix}' identifiers of reactions without "
+        f"names from it."
+    )
+    return identifiers
@@ -16,28 +16,24 @@
 """Populate reaction information."""
 
 
-import asyncio
 import logging
-from typing import Collection, Dict, Set
-
-import pandas as pd
-from cobra_component_models.orm import (
-    Namespace,
-    Reaction,
-    ReactionAnnotation,
-    ReactionName,
-)
+from collections import Counter
+from pathlib import Path
+from typing import Collection, Dict, Iterable, Iterator, Optional, Set
+
 from sqlalchemy.orm import sessionmaker
 from tqdm import tqdm
 
 from ...etl import (
     KEGGReactionNameParser,
-    fetch_kegg_list,
-    fetch_kegg_resources,
+    KEGGResponseStore,
+    SharedTokenBucket,
     reaction_fetcher,
+    split_kegg_flat_file,
 )
-from ...model import KEGGResponsesModel
-from ..helpers import summarize_responses
+from ...model import KEGGResponseModel
+from ..helpers import extract_kegg_resources, summarize_responses
+from .helpers import load_reaction_names, select_unnamed_identifiers
 
 
 __all__ = ()
@@ -51,69 +47,132 @@ Session = sessionmaker()
 
 def extract(
     url: str = "http://rest.kegg.jp/get/",
-    requests_per_second: int = 10,
-) -> pd.DataFrame:
+    requests_per_second: float = 10,
+    max_concurrency: int = 10,
+    batch_size: int = 10,
+    store: Optional[KEGGResponseStore] = None,
+    manifest: Optional[Path] = None,
+    refresh_changed: bool = False,
+    session: Optional[Session] = None,
+    connect_timeout: float = 10,
+    read_timeout: float = 60,
+    max_retries: int = 5,
+    shared_bucket: Optional[SharedTokenBucket] = None,
+) -> Iterator[KEGGResponseModel]:
     """
     Fetch all KEGG reaction descriptions.
 
+    Given a database session, only the descriptions of KEGG reactions are fetched
+    whose annotated reactions do not have any KEGG names yet.
+
     Parameters
     ----------
     url : str, optional
         The URL to query for the KEGG reactions.
-    requests_per_second : int, optional
+    requests_per_second : float, optional
         The desired requests per second to make. The default of 10 is the desired limit
         by KEGG.
+    max_concurrency : int, optional
+        The maximum number of requests in flight at any time (default 10).
+    batch_size : int, optional
+        The number of entries to retrieve with a single request (default 10). KEGG
+        allows at most 10.
+    store : KEGGResponseStore, optional
+        A response store to which responses are written as soon as they are received.
+        Identifiers with a final response in the store are not requested again, which
+        allows resuming an interrupted download.
+    manifest : pathlib.Path, optional
+        The path of a manifest that records the KEGG release and the list
+        descriptions of the entries as of their last fetch. It is compared with the
+        current state of KEGG and updated after every run. A description is only
+        advanced once its entry has been fetched again.
+    refresh_changed : bool, optional
+        Whether to request entries again whose list description has changed since
+        the previous run recorded in the manifest (default false).
+    session : sqlalchemy.orm.session.Session, optional
+        An active session in order to communicate with a SQL database. If given,
+        only the identifiers of its `kegg.reaction` annotated reactions without
+        names are requested. The new responses are merged with all previous ones
+        in the store, if given, and the manifest is neither consulted nor updated
+        since the selection is not complete.
+    connect_timeout : float, optional
+        The number of seconds to wait for establishing a connection (default 10).
+    read_timeout : float, optional
+        The number of seconds to wait for receiving data (default 60).
+    max_retries : int, optional
+        The maximum number of repetitions of a request after network errors, time
+        outs, or server errors (default 5). Identifiers whose requests still fail are
+        recorded with their last status code, or zero without any response.
+    shared_bucket : SharedTokenBucket, optional
+        A token bucket shared by concurrent processes on the same host. Requests
+        additionally draw from it such that the combined rate of all processes is
+        limited.
+
+    Returns
+    -------
+    iterator
+        The KEGG REST API responses, one per reaction identifier. Responses are read
+        lazily from the store if one is given.
 
     """
-    loop = asyncio.get_event_loop()
-    # Fetch a list of all KEGG reaction identifiers.
-    reactions = loop.run_until_complete(fetch_kegg_list("reaction"))
-    df = pd.read_csv(
-        reactions, sep="\t", header=None, index_col=False, names=["id", "description"]
-    )
-    # We strip the prefix from the identifiers and use only unique occurrences.
-    identifiers = df["id"].str[len("rn:") :].unique()
-    data = loop.run_until_complete(
-        fetch_kegg_resources(identifiers, reaction_fetcher, url)
+    targets = None
+    if session is not None:
+        targets = select_unnamed_identifiers(session, "kegg.reaction")
+    return extract_kegg_resources(
+        ["reaction"],
+        reaction_fetcher,
+        split_kegg_flat_file,
+        url,
+        requests_per_second=requests_per_second,
+        max_concurrency=max_concurrency,
+        batch_size=batch_size,
+        store=store,
+        manifest=manifest,
+        refresh_changed=refresh_changed,
+        targets=targets,
+        # The new responses are merged with all previous ones in the store.
+        merge_targets=True,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        max_retries=max_retries,
+        shared_bucket=shared_bucket,
     )
-    loop.close()
-    return data
 
 
-def transform(response: str) -> Dict[str, Set[str]]:
+def transform(responses: Iterable[KEGGResponseModel]) -> Dict[str, Set[str]]:
     """
     Generate a mapping of KEGG reaction identifiers to names.
 
     Parameters
     ----------
-    response : str
-        The JSON collection of KEGG API responses containing reaction descriptions.
+    responses : iterable of KEGGResponseModel
+        The KEGG API responses containing reaction descriptions. They are consumed one
+        by one such that a generator keeps memory usage flat.
 
     Returns
     -------
     dict
         A map of KEGG reaction identifiers to names.
 
-    Raises
-    ------
-    pydantic.ValidationError
-        In case the JSON response data has an unexpected format.
-
     """
-    data = KEGGResponsesModel.parse_raw(response)
-    summarize_responses(data)
-    return {
-        response.identifier: names
-        for response in tqdm(data.__root__, desc="Reaction")
-        if response.status_code == 200
-        and (names := KEGGReactionNameParser.parse(response.response))
-    }
+    status_codes = Counter()
+    id2names = {}
+    for response in tqdm(responses, desc="Reaction"):
+        status_codes[response.status_code] += 1
+        if response.status_code != 200:
+            continue
+        if names := KEGGReactionNameParser.parse(response.response):
+            id2names[response.identifier] = names
+    summarize_responses(status_codes)
+    return id2names
 
 
 def load(
     session: Session,
     id2names: Dict[str, Collection[str]],
     batch_size: int = 1000,
+    vectorized: bool = True,
+    streaming: bool = False,
 ) -> None:
     """
     Load KEGG reaction names into a database.
@@ -126,48 +185,19 @@ def load(
         A map of KEGG reaction identifiers to names.
     batch_size : int, optional
         The size of batches to process the data in.
+    vectorized : bool, optional
+        Whether to determine new names with set operations on the whole data frame
+        (default) or reaction by reaction.
+    streaming : bool, optional
+        Whether to stream the annotations ordered by reaction such that memory usage
+        remains bounded (default False).
 
     """
-    # Fetch all reactions from the database that have KEGG identifiers.
-    kegg_ns: Namespace = (
-        session.query(Namespace).filter(Namespace.prefix == "kegg.reaction").one()
-    )
-    query = (
-        session.query(Reaction.id, ReactionAnnotation.identifier, ReactionName.name)
-        .select_from(Reaction)
-        .join(ReactionAnnotation)
-        .join(ReactionName)
-        .join(Namespace)
-        .filter(Namespace.id == kegg_ns.id)
+    load_reaction_names(
+        session,
+        "kegg.reaction",
+        id2names,
+        batch_size=batch_size,
+        vectorized=vectorized,
+        streaming=streaming,
     )
-    df = pd.read_sql_query(query.statement, session.bind)
-    # Only unique names per reaction and namespace are allowed. Thus we group the
-    # data by reaction index so that we can later make the names unique.
-    grouped = df.groupby("id", as_index=False, sort=False)
-    reaction_ids = df["id"].unique()
-    with tqdm(total=len(reaction_ids), desc="Reaction", unit_scale=True) as pbar:
-        for index in range(0, len(reaction_ids), batch_size):
-            mappings = []
-            batch = reaction_ids[index : index + batch_size]
-            for rxn_id in batch:
-                sub = grouped.get_group(rxn_id)
-                # Create unique names per reaction.
-                names = set()
-                for seed_id in sub["identifier"].unique():
-                    if labels := id2names.get(seed_id, None):
-                        names.update(labels)
-                # Remove existing names.
-                names.difference_update(sub["name"].unique())
-                # Apparently, `numpy.int` ends up as a BLOB in the database. We
-                # convert to native `int` here.
-                mappings.extend(
-                    {
-                        "reaction_id": int(rxn_id),
-                        "namespace_id": kegg_ns.id,
-                        "name": n,
-                    }
-                    for n in names
-                )
-            session.bulk_insert_mappings(ReactionName, mappings)
-            session.commit()
-            pbar.update(len(batch))
@@ -20,17 +20,10 @@ import logging
 from typing import Collection, Dict, Set
 
 import httpx
-import pandas as pd
-from cobra_component_models.orm import (
-    Namespace,
-    Reaction,
-    ReactionAnnotation,
-    ReactionName,
-)
 from sqlalchemy.orm import sessionmaker
-from tqdm import tqdm
 
 from ...model import SEEDReactionsModel
+from .helpers import load_reaction_names
 
 
 __all__ = ()
@@ -104,6 +97,8 @@ def load(
     session: Session,
     id2names: Dict[str, Collection[str]],
     batch_size: int = 1000,
+    vectorized: bool = True,
+    streaming: bool = False,
 ) -> None:
     """
     Load SEED reaction names into a database.
@@ -116,48 +111,19 @@ def load(
         A map of SEED reaction identifiers to names.
     batch_size : int, optional
         The size of batches to process the data in.
+    vectorized : bool, optional
+        Whether to determine new names with set operations on the whole data frame
+        (default) or reaction by reaction.
+    streaming : bool, optional
+        Whether to stream the annotations ordered by reaction such that memory usage
+        remains bounded (default False).
 
     """
-    # Fetch all reactions from the database that have SEED identifiers.
-    seed_ns: Namespace = (
-        session.query(Namespace).filter(Namespace.prefix == "seed.reaction").one()
+    load_reaction_names(
+        session,
+        "seed.reaction",
+        id2names,
+        batch_size=batch_size,
+        vectorized=vectorized,
+        streaming=streaming,
     )
-    query = (
-        session.query(Reaction.id, ReactionAnnotation.identifier, ReactionName.name)
-        .select_from(Reaction)
-        .join(ReactionAnnotation)
-        .join(ReactionName)
-        .join(Namespace)
-        .filter(Namespace.id == seed_ns.id)
-    )
-    df = pd.read_sql_query(query.statement, session.bind)
-    # Only unique names per reaction and namespace are allowed. Thus we group the
-    # data by reaction index so that we can later make the names unique.
-    grouped = df.groupby("id", as_index=False, sort=False)
-    reaction_ids = df["id"].unique()
-    with tqdm(total=len(reaction_ids), desc="Reaction", unit_scale=True) as pbar:
-        for index in range(0, len(reaction_ids), batch_size):
-            mappings = []
-            batch = reaction_ids[index : index + batch_size]
-            for rxn_id in batch:
-                sub = grouped.get_group(rxn_id)
-                # Create unique names per reaction.
-                names = set()
-                for seed_id in sub["identifier"].unique():
-                    if labels := id2names.get(seed_id, None):
-                        names.update(labels)
-                # Remove existing names.
-                names.difference_update(sub["name"].unique())
-                # Apparently, `numpy.int` ends up as a BLOB in the database. We
-                # convert to native `int` here.
-                mappings.extend(
-                    {
-                        "reaction_id": int(rxn_id),
-                        "namespace_id": seed_ns.id,
-                        "name": n,
-                    }
-                    for n in names
-                )
-            session.bulk_insert_mappings(ReactionName, mappings)
-            session.commit()
-            pbar.update(len(batch))
@@ -20,13 +20,17 @@ import json
 import logging
 import sys
 from pathlib import Path
+from typing import Optional
 
 import click
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from ...api import read_kegg_responses, write_kegg_responses
 from ...api.compound import kegg as kegg_api
-from ..helpers import JSON_SEPARATORS
+from ...etl import KEGGResponseStore, SharedTokenBucket, StructurePropertyCache
+from ..helpers import JSON_SEPARATORS, validate_positive
+from ..main import NUM_PROCESSES
 
 
 logger = logging.getLogger(__name__)
@@ -48,23 +52,133 @@ def kegg():
     "--filename",
     "-f",
     type=click.Path(dir_okay=False, writable=True, exists=False),
-    default="kegg_compounds.json",
+    default="kegg_compounds.jsonl.gz",
     show_default=True,
-    help="The output path for the KEGG MDL MOL blocks.",
+    help="The output path for the KEGG MDL MOL blocks. A '.jsonl' suffix selects the "
+    "JSON Lines format and a '.gz' suffix compresses the output.",
 )
 @click.option(
     "--rate-limit",
-    type=int,
+    type=float,
     default=10,
     show_default=True,
     help="The requests per second to make. The default of 10 is the desired limit by "
     "KEGG.",
 )
-def extract(filename: click.Path, rate_limit: int):
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+    help="The maximum number of requests in flight at any time.",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1, max=10),
+    default=10,
+    show_default=True,
+    help="The number of entries to retrieve with a single request.",
+)
+@click.option(
+    "--store",
+    type=click.Path(dir_okay=False, writable=True),
+    default="kegg_compounds_store.jsonl",
+    show_default=True,
+    help="The path of the response store to which responses are written as they "
+    "arrive. Identifiers already in the store are skipped when resuming.",
+)
+@click.option(
+    "--manifest",
+    type=click.Path(dir_okay=False, writable=True),
+    default="kegg_compounds_manifest.json",
+    show_default=True,
+    help="The path of the manifest recording the KEGG release and the descriptions "
+    "of the entries as of their last fetch.",
+)
+@click.option(
+    "--refresh-changed",
+    is_flag=True,
+    default=False,
+    help="Fetch entries again whose description changed since the previous run.",
+)
+@click.option(
+    "--db-uri",
+    metavar="<URI>",
+    default=None,
+    help="An rfc1738 compatible database URI. If given, only the KEGG entries of its "
+    "compounds without an InChI are fetched, the most referenced first.",
+)
+@click.option(
+    "--connect-timeout",
+    type=float,
+    callback=validate_positive,
+    default=10,
+    show_default=True,
+    help="The number of seconds to wait for establishing a connection.",
+)
+@click.option(
+    "--read-timeout",
+    type=float,
+    callback=validate_positive,
+    default=60,
+    show_default=True,
+    help="The number of seconds to wait for receiving data.",
+)
+@click.option(
+    "--max-retries",
+    type=click.IntRange(min=0),
+    default=5,
+    show_default=True,
+    help="The maximum number of repetitions of a request after network errors, "
+    "time outs, or server errors.",
+)
+@click.option(
+    "--shared-rate-limit",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="The path of a SQLite file through which all processes on this host that "
+    "are given the same path share one budget of requests per second.",
+)
+def extract(
+    filename: click.Path,
+    rate_limit: float,
+    concurrency: int,
+    batch_size: int,
+    store: click.Path,
+    manifest: click.Path,
+    refresh_changed: bool,
+    db_uri: Optional[str],
+    connect_timeout: float,
+    read_timeout: float,
+    max_retries: int,
+    shared_rate_limit: Optional[click.Path],
+):
     """Fetch MDL MOL blocks for all compounds in KEGG."""
     logger.info("Downloading KEGG MDL MOL blocks.")
-    result = kegg_api.extract(requests_per_second=rate_limit)
-    result.to_json(filename, orient="records")
+    shared_bucket = None
+    if shared_rate_limit is not None:
+        shared_bucket = SharedTokenBucket(path=Path(shared_rate_limit), rate=rate_limit)
+    session = None
+    if db_uri is not None:
+        session = Session(bind=create_engine(db_uri))
+    try:
+        responses = kegg_api.extract(
+            requests_per_second=rate_limit,
+            max_concurrency=concurrency,
+            batch_size=batch_size,
+            store=KEGGResponseStore(path=Path(store)),
+            manifest=Path(manifest),
+            refresh_changed=refresh_changed,
+            session=session,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            max_retries=max_retries,
+            shared_bucket=shared_bucket,
+        )
+    finally:
+        if session is not None:
+            session.close()
+    write_kegg_responses(responses, Path(filename))
 
 
 @kegg.command()
@@ -76,9 +190,9 @@ def extract(filename: click.Path, rate_limit: int):
     "--filename",
     "-f",
     type=click.Path(dir_okay=False, writable=True, exists=False),
-    default="kegg_inchi.json",
+    default="kegg_structures.json",
     show_default=True,
-    help="The output path for the KEGG compound identifier to InChI JSON file.",
+    help="The output path for the KEGG compound identifier to structure JSON file.",
 )
 @click.option(
     "--backend",
@@ -87,12 +201,57 @@ def extract(filename: click.Path, rate_limit: int):
     show_default=True,
     help="The chem-informatics library to use for computing compound information.",
 )
-def transform(response: click.Path, filename: click.Path, backend: str):
+@click.option(
+    "--processes",
+    type=click.IntRange(min=1),
+    default=NUM_PROCESSES,
+    show_default=True,
+    help="The number of parallel processes to convert MOL blocks with.",
+)
+@click.option(
+    "--cache",
+    type=click.Path(dir_okay=False, writable=True),
+    default="structure_properties.db",
+    show_default=True,
+    help="The SQLite cache of structure properties computed by the backend.",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=1),
+    default=1_000_000,
+    show_default=True,
+    help="The maximum number of structures to keep in the cache.",
+)
+@click.option(
+    "--retry-failed",
+    is_flag=True,
+    default=False,
+    help="Convert structures again that failed in previous runs.",
+)
+@click.option(
+    "--timeout",
+    type=float,
+    callback=validate_positive,
+    default=None,
+    help="The number of seconds that a single structure may take. If given, "
+    "structures are converted in isolated processes that are replaced when they "
+    "exceed it.",
+)
+def transform(
+    response: click.Path,
+    filename: click.Path,
+    backend: str,
+    processes: int,
+    cache: click.Path,
+    cache_size: int,
+    retry_failed: bool,
+    timeout: Optional[float],
+):
     """
-    Generate a mapping from KEGG compound identifiers to InChIs.
+    Generate a mapping from KEGG compound identifiers to structure information.
 
     \b
-    RESPONSE is the JSON response containing KEGG universal expasy.
+    RESPONSE is the JSON or JSON Lines file of KEGG API responses.
 
     """
     if backend == "rdkit":
@@ -121,10 +280,24 @@ def transform(response: click.Path, filename: click.Path, backend: str):
         logger.critical("No chem-informatics backend available. Aborting.")
         sys.exit(1)
     logger.info("Generating compounds from KEGG MDL MOL blocks.")
-    with Path(response).open() as handle:
-        id2inchi = kegg_api.transform(handle.read(), MoleculeAdapter)
+    name, version = MoleculeAdapter.get_backend()
+    with StructurePropertyCache(
+        path=Path(cache),
+        backend=name,
+        version=version,
+        max_entries=cache_size,
+        retry_failed=retry_failed,
+    ) as structure_cache:
+        id2structure = kegg_api.transform(
+            read_kegg_responses(Path(response)),
+            MoleculeAdapter,
+            processes=processes,
+            cache=structure_cache,
+            timeout=timeout,
+        )
+        structure_cache.summarize()
     with Path(filename).open("w") as handle:
-        json.dump(id2inchi, handle, separators=JSON_SEPARATORS)
+        json.dump(id2structure, handle, separators=JSON_SEPARATORS)
 
 
 @kegg.command()
@@ -140,22 +313,28 @@ def transform(response: click.Path, filename: click.Path, backend: str):
     show_default=True,
     help="The output path for compound conflicts related to KEGG InChIs.",
 )
-def load(db_uri: str, filename: click.Path, report: click.Path):
+@click.option(
+    "--streaming",
+    is_flag=True,
+    default=False,
+    help="Stream the database rows in batches to bound the memory usage.",
+)
+def load(db_uri: str, filename: click.Path, report: click.Path, streaming: bool):
     """
     Load KEGG reaction names into a database.
 
     \b
     URI is a string interpreted as an rfc1738 compatible database URI.
-    FILENAME is the KEGG compound identifier to InChI mapping JSON file.
+    FILENAME is the KEGG compound identifier to structure mapping JSON file.
 
     """
     engine = create_engine(db_uri)
     session = Session(bind=engine)
     with Path(filename).open() as handle:
-        id2inchi = json.load(handle)
-    logger.info("Adding KEGG compound InChIs to the database.")
+        id2structure = json.load(handle)
+    logger.info("Adding KEGG compound structures to the database.")
     try:
-        conflicts = kegg_api.load(session, id2inchi)
+        conflicts = kegg_api.load(session, id2structure, streaming=streaming)
     finally:
         session.close()
     with Path(report).open("w") as handle:
@@ -18,12 +18,17 @@
 
 import logging
 import sys
+from pathlib import Path
+from typing import Optional
 
 import click
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from ...api.compound import structure as structure_api
+from ...etl import StructurePropertyCache
+from ..helpers import validate_positive
+from ..main import NUM_PROCESSES
 
 
 logger = logging.getLogger(__name__)
@@ -49,9 +54,58 @@ def structures():
     show_default=True,
     help="The chem-informatics library to use for computing compound information.",
 )
+@click.option(
+    "--processes",
+    type=click.IntRange(min=1),
+    default=NUM_PROCESSES,
+    show_default=True,
+    help="The number of parallel processes to compute compound information with.",
+)
+@click.option(
+    "--checkpoint",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="A file recording the last processed compound. An interrupted run resumes "
+    "from it and must therefore be given the same database.",
+)
+@click.option(
+    "--cache",
+    type=click.Path(dir_okay=False, writable=True),
+    default="structure_properties.db",
+    show_default=True,
+    help="The SQLite cache of structure properties computed by the backend.",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=1),
+    default=1_000_000,
+    show_default=True,
+    help="The maximum number of structures to keep in the cache.",
+)
+@click.option(
+    "--retry-failed",
+    is_flag=True,
+    default=False,
+    help="Convert structures again that failed in previous runs.",
+)
+@click.option(
+    "--timeout",
+    type=float,
+    callback=validate_positive,
+    default=None,
+    help="The number of seconds that a single structure may take. If given, "
+    "structures are converted in isolated processes that are replaced when they "
+    "exceed it.",
+)
 def etl(
     db_uri: str,
     backend: str,
+    processes: int,
+    checkpoint: Optional[click.Path],
+    cache: click.Path,
+    cache_size: int,
+    retry_failed: bool,
+    timeout: Optional[float],
 ):
     """
     Try to augment any missing structural compound information.
@@ -88,4 +142,23 @@ def etl(
 
     engine = create_engine(db_uri)
     session = Session(bind=engine)
-    structure_api.augment_information(session, MoleculeAdapter)
+    name, version = MoleculeAdapter.get_backend()
+    try:
+        with StructurePropertyCache(
+            path=Path(cache),
+            backend=name,
+            version=version,
+            max_entries=cache_size,
+            retry_failed=retry_failed,
+        ) as structure_cache:
+            structure_api.augment_information(
+                session,
+                MoleculeAdapter,
+                processes=processes,
+                checkpoint=None if checkpoint is None else Path(checkpoint),
+                cache=structure_cache,
+                timeout=timeout,
+            )
+            structure_cache.summarize()
+    finally:
+        session.close()
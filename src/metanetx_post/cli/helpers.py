@@ -16,7 +16,12 @@
 """Provide helper functions and values."""
 
 
-__all__ = ("JSON_SEPARATORS", "convert2json_type")
+from typing import Optional
+
+import click
+
+
+__all__ = ("JSON_SEPARATORS", "convert2json_type", "validate_positive")
 
 
 JSON_SEPARATORS = (",", ":")
@@ -28,3 +33,12 @@ def convert2json_type(obj: set) -> list:
         return list(obj)
     else:
         raise TypeError(f"Object of type {type(obj)} is not JSON serializable.")
+
+
+def validate_positive(
+    ctx: click.Context, param: click.Parameter, value: Optional[float]
+) -> Optional[float]:
+    """Reject option values that are not strictly positive."""
+    if value is not None and value <= 0:
+        raise click.BadParameter(f"{value} is not a positive number.")
+    return value
@@ -92,7 +92,13 @@ def transform(response: click.Path, filename: click.Path):
 @click.argument(
     "filename", metavar="<FILENAME>", type=click.Path(dir_okay=False, exists=True)
 )
-def load(db_uri: str, filename: click.Path):
+@click.option(
+    "--streaming",
+    is_flag=True,
+    default=False,
+    help="Stream the database rows in batches to bound the memory usage.",
+)
+def load(db_uri: str, filename: click.Path, streaming: bool):
     """
     Load BiGG reaction names into a database.
 
@@ -107,6 +113,6 @@ def load(db_uri: str, filename: click.Path):
         id2name = json.load(handle)
     logger.info("Adding BiGG universal reaction names to database.")
     try:
-        bigg_api.load(session, id2name)
+        bigg_api.load(session, id2name, streaming=streaming)
     finally:
         session.close()
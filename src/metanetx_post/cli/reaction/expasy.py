@@ -112,7 +112,13 @@ def transform(rdf: click.Path, filename: click.Path, replacement: click.Path):
 @click.argument(
     "replacement", metavar="<REPLACEMENT>", type=click.Path(dir_okay=False, exists=True)
 )
-def load(db_uri: str, filename: click.Path, replacement: click.Path):
+@click.option(
+    "--streaming",
+    is_flag=True,
+    default=False,
+    help="Stream the database rows in batches to bound the memory usage.",
+)
+def load(db_uri: str, filename: click.Path, replacement: click.Path, streaming: bool):
     """
     Load EC-code names into a database.
 
@@ -130,6 +136,6 @@ def load(db_uri: str, filename: click.Path, replacement: click.Path):
         obsoletes = json.load(handle)
     logger.info("Adding EC-code names to database.")
     try:
-        expasy_api.load(session, id2name, obsoletes)
+        expasy_api.load(session, id2name, obsoletes, streaming=streaming)
     finally:
         session.close()
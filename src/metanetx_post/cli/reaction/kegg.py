@@ -19,13 +19,16 @@
 import json
 import logging
 from pathlib import Path
+from typing import Optional
 
 import click
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from ...api import read_kegg_responses, write_kegg_responses
 from ...api.reaction import kegg as kegg_api
-from ..helpers import JSON_SEPARATORS, convert2json_type
+from ...etl import KEGGResponseStore, SharedTokenBucket
+from ..helpers import JSON_SEPARATORS, convert2json_type, validate_positive
 
 
 logger = logging.getLogger(__name__)
@@ -47,23 +50,134 @@ def kegg():
     "--filename",
     "-f",
     type=click.Path(dir_okay=False, writable=True, exists=False),
-    default="kegg_reactions.json",
+    default="kegg_reactions.jsonl.gz",
     show_default=True,
-    help="The output path for the KEGG reactions JSON response.",
+    help="The output path for the KEGG reactions JSON response. A '.jsonl' suffix "
+    "selects the JSON Lines format and a '.gz' suffix compresses the output.",
 )
 @click.option(
     "--rate-limit",
-    type=int,
+    type=float,
     default=10,
     show_default=True,
     help="The requests per second to make. The default of 10 is the desired limit by "
     "KEGG.",
 )
-def extract(filename: click.Path, rate_limit: int):
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+    help="The maximum number of requests in flight at any time.",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1, max=10),
+    default=10,
+    show_default=True,
+    help="The number of entries to retrieve with a single request.",
+)
+@click.option(
+    "--store",
+    type=click.Path(dir_okay=False, writable=True),
+    default="kegg_reactions_store.jsonl",
+    show_default=True,
+    help="The path of the response store to which responses are written as they "
+    "arrive. Identifiers already in the store are skipped when resuming.",
+)
+@click.option(
+    "--manifest",
+    type=click.Path(dir_okay=False, writable=True),
+    default="kegg_reactions_manifest.json",
+    show_default=True,
+    help="The path of the manifest recording the KEGG release and the descriptions "
+    "of the entries as of their last fetch.",
+)
+@click.option(
+    "--refresh-changed",
+    is_flag=True,
+    default=False,
+    help="Fetch entries again whose description changed since the previous run.",
+)
+@click.option(
+    "--db-uri",
+    metavar="<URI>",
+    default=None,
+    help="An rfc1738 compatible database URI. If given, only the KEGG reactions "
+    "annotated on its reactions without KEGG names are fetched and merged with the "
+    "store.",
+)
+@click.option(
+    "--connect-timeout",
+    type=float,
+    callback=validate_positive,
+    default=10,
+    show_default=True,
+    help="The number of seconds to wait for establishing a connection.",
+)
+@click.option(
+    "--read-timeout",
+    type=float,
+    callback=validate_positive,
+    default=60,
+    show_default=True,
+    help="The number of seconds to wait for receiving data.",
+)
+@click.option(
+    "--max-retries",
+    type=click.IntRange(min=0),
+    default=5,
+    show_default=True,
+    help="The maximum number of repetitions of a request after network errors, "
+    "time outs, or server errors.",
+)
+@click.option(
+    "--shared-rate-limit",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="The path of a SQLite file through which all processes on this host that "
+    "are given the same path share one budget of requests per second.",
+)
+def extract(
+    filename: click.Path,
+    rate_limit: float,
+    concurrency: int,
+    batch_size: int,
+    store: click.Path,
+    manifest: click.Path,
+    refresh_changed: bool,
+    db_uri: Optional[str],
+    connect_timeout: float,
+    read_timeout: float,
+    max_retries: int,
+    shared_rate_limit: Optional[click.Path],
+):
     """Fetch all KEGG reaction descriptions."""
     logger.info("Downloading KEGG reactions.")
-    result = kegg_api.extract(requests_per_second=rate_limit)
-    result.to_json(filename, orient="records")
+    shared_bucket = None
+    if shared_rate_limit is not None:
+        shared_bucket = SharedTokenBucket(path=Path(shared_rate_limit), rate=rate_limit)
+    session = None
+    if db_uri is not None:
+        session = Session(bind=create_engine(db_uri))
+    try:
+        responses = kegg_api.extract(
+            requests_per_second=rate_limit,
+            max_concurrency=concurrency,
+            batch_size=batch_size,
+            store=KEGGResponseStore(path=Path(store)),
+            manifest=Path(manifest),
+            refresh_changed=refresh_changed,
+            session=session,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            max_retries=max_retries,
+            shared_bucket=shared_bucket,
+        )
+    finally:
+        if session is not None:
+            session.close()
+    write_kegg_responses(responses, Path(filename))
 
 
 @kegg.command()
@@ -84,12 +198,11 @@ def transform(response: click.Path, filename: click.Path):
     Generate a mapping of KEGG reaction identifiers to names.
 
     \b
-    RESPONSE is the JSON response containing KEGG universal expasy.
+    RESPONSE is the JSON or JSON Lines file of KEGG API responses.
 
     """
     logger.info("Generating KEGG reactions identifier to names mapping.")
-    with Path(response).open() as handle:
-        id2names = kegg_api.transform(handle.read())
+    id2names = kegg_api.transform(read_kegg_responses(Path(response)))
     with Path(filename).open("w") as handle:
         json.dump(
             id2names, handle, default=convert2json_type, separators=JSON_SEPARATORS
@@ -102,7 +215,13 @@ def transform(response: click.Path, filename: click.Path):
 @click.argument(
     "filename", metavar="<FILENAME>", type=click.Path(dir_okay=False, exists=True)
 )
-def load(db_uri: str, filename: click.Path):
+@click.option(
+    "--streaming",
+    is_flag=True,
+    default=False,
+    help="Stream the database rows in batches to bound the memory usage.",
+)
+def load(db_uri: str, filename: click.Path, streaming: bool):
     """
     Load KEGG reaction names into a database.
 
@@ -117,6 +236,6 @@ def load(db_uri: str, filename: click.Path):
         id2name = json.load(handle)
     logger.info("Adding KEGG reaction names to database.")
     try:
-        kegg_api.load(session, id2name)
+        kegg_api.load(session, id2name, streaming=streaming)
     finally:
         session.close()
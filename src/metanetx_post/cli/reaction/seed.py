@@ -94,7 +94,13 @@ def transform(response: click.Path, filename: click.Path):
 @click.argument(
     "filename", metavar="<FILENAME>", type=click.Path(dir_okay=False, exists=True)
 )
-def load(db_uri: str, filename: click.Path):
+@click.option(
+    "--streaming",
+    is_flag=True,
+    default=False,
+    help="Stream the database rows in batches to bound the memory usage.",
+)
+def load(db_uri: str, filename: click.Path, streaming: bool):
     """
     Load SEED reaction names into a database.
 
@@ -109,6 +115,6 @@ def load(db_uri: str, filename: click.Path):
         id2names = json.load(handle)
     logger.info("Adding SEED reaction names to database.")
     try:
-        seed_api.load(session, id2names)
+        seed_api.load(session, id2names, streaming=streaming)
     finally:
         session.close()
@@ -16,6 +16,11 @@
 """Provide high-level ETL functions."""
 
 
+from .rate_limit import *
+from .response_store import *
+from .structure_cache import *
+from .worker_pool import *
 from .kegg_helpers import *
 from .compound import *
+from .inchi import *
 from .reaction import *
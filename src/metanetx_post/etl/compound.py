@@ -17,13 +17,14 @@
 
 
 import logging
-from typing import Any, Coroutine
+import re
+from typing import Any, Coroutine, Dict, Sequence
 
 import httpx
 from sqlalchemy.orm import sessionmaker
 
 
-__all__ = ("kegg_mol_fetcher",)
+__all__ = ("kegg_mol_fetcher", "split_kegg_mol_blocks")
 
 
 logger = logging.getLogger(__name__)
@@ -32,6 +33,10 @@ logger = logging.getLogger(__name__)
 Session = sessionmaker()
 
 
+MOL_BLOCK_END = re.compile(r"^M  END$", re.MULTILINE)
+SDF_ENTRY = re.compile(r"^> <ENTRY>\n(?:\w+:)?(\S+)$", re.MULTILINE)
+
+
 def kegg_mol_fetcher(
     identifier: str, client: httpx.AsyncClient
 ) -> Coroutine[Any, Any, httpx.Response]:
@@ -52,3 +57,55 @@ def kegg_mol_fetcher(
 
     """
     return client.get(f"{identifier}/mol")
+
+
+def split_kegg_mol_blocks(identifiers: Sequence[str], text: str) -> Dict[str, str]:
+    """
+    Split a multi-entry KEGG MDL MOL response into its individual MOL blocks.
+
+    KEGG concatenates multiple MOL blocks in the structure-data file (SDF) format,
+    i.e., records are terminated by a line `$$$$` and may carry an `ENTRY` data item.
+    Records are matched to identifiers by that data item or, if it is absent, by
+    their order as long as every requested identifier has a record.
+
+    Parameters
+    ----------
+    identifiers : sequence of str
+        The KEGG identifiers that were requested together.
+    text : str
+        The concatenated MOL blocks.
+
+    Returns
+    -------
+    dict
+        A map from the requested identifiers to their MOL blocks. Identifiers for
+        which KEGG returned no MOL block are missing.
+
+    Raises
+    ------
+    ValueError
+        If the records cannot be unambiguously matched to the identifiers.
+
+    """
+    # The first line of a MOL block may be empty so we must not strip whitespace.
+    records = [
+        r for r in re.split(r"^\$\$\$\$\n?", text, flags=re.MULTILINE) if r.strip()
+    ]
+    tags = [SDF_ENTRY.search(r) for r in records]
+    if all(tags):
+        keys = [t.group(1) for t in tags]
+        if not set(keys).issubset(identifiers):
+            raise ValueError("Failed to match a MOL block to an identifier.")
+    elif len(records) == len(identifiers):
+        keys = identifiers
+    else:
+        raise ValueError(
+            f"Cannot match {len(records)} MOL blocks to {len(identifiers)} identifiers."
+        )
+    result = {}
+    for key, record in zip(keys, records):
+        # We only keep the MOL block itself and drop any trailing data items.
+        if (end := MOL_BLOCK_END.search(record)) is None:
+            raise ValueError("Incomplete MOL block in response.")
+        result[key] = record[: end.end()] + "\n"
+    return result
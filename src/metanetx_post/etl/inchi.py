@@ -0,0 +1,145 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Provide functions that read compound properties directly from InChI layers."""
+
+
+import logging
+import re
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+
+__all__ = ("split_inchi_layers", "parse_inchi_formula_and_charge")
+
+
+logger = logging.getLogger(__name__)
+
+
+COMPONENT = re.compile(r"^(\d*)((?:[A-Z][a-z]?\d*)*)$")
+ELEMENT = re.compile(r"([A-Z][a-z]?)(\d*)")
+CHARGE = re.compile(r"^(?:(\d+)\*)?([+-]\d+)?$")
+
+
+def split_inchi_layers(inchi: str) -> Dict[str, str]:
+    """
+    Split the main layers of an InChI string by their prefix.
+
+    Parameters
+    ----------
+    inchi : str
+        An InChI string such as `InChI=1S/C2H4O2/c1-2(3)4/h1H3,(H,3,4)/p-1`.
+
+    Returns
+    -------
+    dict
+        A map from layer prefixes to their contents. The formula layer, which has
+        no prefix, is stored under the empty string. The fixed hydrogen (`/f`) and
+        reconnected (`/r`) layers and everything after them are omitted, and of the
+        isotopic sub-layers only those with new prefixes are kept.
+
+    Raises
+    ------
+    ValueError
+        If the string does not start with an InChI version.
+
+    """
+    if not inchi.startswith("InChI="):
+        raise ValueError(f"Not an InChI string '{inchi}'.")
+    _, *layers = inchi.split("/")
+    result = {}
+    if layers and (not layers[0] or not layers[0][0].islower()):
+        result[""] = layers.pop(0)
+    for layer in layers:
+        if not layer:
+            continue
+        if layer[0] in "fr":
+            break
+        result.setdefault(layer[0], layer[1:])
+    return result
+
+
+def _format_formula(counts: Counter, charge: int) -> str:
+    """Return a formula in Hill notation followed by the charge."""
+    # Like RDKit, hydrogen directly follows carbon even in formulae without carbon.
+    elements = [e for e in ("C", "H") if e in counts]
+    elements.extend(sorted(e for e in counts if e not in ("C", "H")))
+    formula = "".join(
+        f"{element}{counts[element] if counts[element] > 1 else ''}"
+        for element in elements
+    )
+    if charge == 0:
+        return formula
+    sign = "+" if charge > 0 else "-"
+    return f"{formula}{sign}{abs(charge) if abs(charge) > 1 else ''}"
+
+
+def parse_inchi_formula_and_charge(inchi: str) -> Optional[Tuple[str, int]]:
+    """
+    Read the chemical formula and formal charge from the layers of an InChI.
+
+    The main layer formula lists the neutral components. Their charges are given
+    by the `/q` layer and the mobile protons added or removed by the `/p` layer,
+    which changes both the number of hydrogen atoms and the charge. The formula is
+    formatted like RDKit does, that is, in Hill notation with a trailing charge
+    such as `Mg+2`.
+
+    Parameters
+    ----------
+    inchi : str
+        An InChI string.
+
+    Returns
+    -------
+    tuple or None
+        The chemical formula and the formal charge or `None` if the layers could
+        not be interpreted.
+
+    """
+    try:
+        layers = split_inchi_layers(inchi)
+    except ValueError as error:
+        logger.debug(str(error))
+        return
+    counts = Counter()
+    for component in layers.get("", "").split("."):
+        if not component:
+            continue
+        if (match := COMPONENT.match(component)) is None:
+            logger.debug(f"Cannot interpret the InChI formula component '{component}'.")
+            return
+        multiplier = int(match.group(1) or 1)
+        for element, count in ELEMENT.findall(match.group(2)):
+            counts[element] += multiplier * int(count or 1)
+    charge = 0
+    for component in layers.get("q", "").split(";"):
+        if (match := CHARGE.match(component)) is None:
+            logger.debug(f"Cannot interpret the InChI charge component '{component}'.")
+            return
+        charge += int(match.group(1) or 1) * int(match.group(2) or 0)
+    protons = 0
+    if "p" in layers:
+        try:
+            protons = int(layers["p"])
+        except ValueError:
+            logger.debug(f"Cannot interpret the InChI proton layer '{layers['p']}'.")
+            return
+    counts["H"] += protons
+    if counts["H"] < 0:
+        return
+    counts = Counter({e: n for e, n in counts.items() if n > 0})
+    if not counts:
+        return
+    return _format_formula(counts, charge + protons), charge + protons
@@ -18,20 +18,37 @@
 
 import asyncio
 import logging
+import random
+import re
 import time
+from collections import Counter
 from io import StringIO
-from math import ceil
-from typing import Any, Callable, Collection, Coroutine, Tuple
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Coroutine,
+    Dict,
+    Iterable,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import httpx
-from pandas import DataFrame
+from pandas import DataFrame, read_csv
 from sqlalchemy.orm import sessionmaker
 from tqdm import tqdm
 
+from .rate_limit import AdaptiveTokenBucket, SharedTokenBucket
+from .response_store import KEGGResponseStore
+
 
 __all__ = (
     "fetch_kegg_list",
+    "fetch_kegg_entries",
     "fetch_kegg_resources",
+    "split_kegg_flat_file",
 )
 
 
@@ -41,6 +58,17 @@ logger = logging.getLogger(__name__)
 Session = sessionmaker()
 
 
+# The HTTP status codes with which servers signal that requests are too frequent.
+THROTTLING_STATUS_CODES = frozenset({403, 429})
+
+
+# The status code recorded for requests that did not receive any response.
+NETWORK_ERROR_STATUS_CODE = 0
+
+
+FLAT_FILE_ENTRY = re.compile(r"^ENTRY\s+(\S+)", re.MULTILINE)
+
+
 async def fetch_kegg_list(
     database: str,
     url: str = "http://rest.kegg.jp/list",
@@ -56,17 +84,114 @@ async def fetch_kegg_list(
     return text
 
 
+async def fetch_kegg_entries(
+    databases: Iterable[str],
+    url: str = "http://rest.kegg.jp/list",
+) -> Dict[str, str]:
+    """
+    Fetch the identifiers and descriptions of all entries in the given KEGG databases.
+
+    Parameters
+    ----------
+    databases : iterable of str
+        The names of KEGG databases, for example, 'compound' or 'reaction'.
+    url : str, optional
+        The URL of the KEGG REST API list operation.
+
+    Returns
+    -------
+    dict
+        A map from KEGG identifiers, stripped of any database prefix such as 'cpd:',
+        to their descriptions.
+
+    """
+    entries = {}
+    for database in databases:
+        text = await fetch_kegg_list(database, url)
+        df = read_csv(
+            text,
+            sep="\t",
+            header=None,
+            index_col=False,
+            names=["id", "description"],
+            dtype=str,
+        )
+        # Older versions of the KEGG REST API prefix identifiers with the database.
+        identifiers = df["id"].str.replace(r"^[a-z]+:", "", regex=True)
+        entries.update(zip(identifiers, df["description"].fillna("")))
+    return entries
+
+
+def split_kegg_flat_file(identifiers: Sequence[str], text: str) -> Dict[str, str]:
+    """
+    Split a multi-entry KEGG flat file response into its individual entries.
+
+    Parameters
+    ----------
+    identifiers : sequence of str
+        The KEGG identifiers that were requested together.
+    text : str
+        The concatenated flat file entries, each terminated by a line `///`.
+
+    Returns
+    -------
+    dict
+        A map from the requested identifiers to their entries. Identifiers for which
+        KEGG returned no entry are missing.
+
+    Raises
+    ------
+    ValueError
+        If an entry cannot be matched to a requested identifier.
+
+    """
+    requested = set(identifiers)
+    result = {}
+    for record in text.split("\n///\n"):
+        if not record.strip():
+            continue
+        match = FLAT_FILE_ENTRY.search(record)
+        if match is None or match.group(1) not in requested:
+            raise ValueError("Failed to match a flat file entry to an identifier.")
+        # We restore the terminator such that entries look like single responses.
+        result[match.group(1)] = f"{record.lstrip()}\n///\n"
+    return result
+
+
 async def fetch_kegg_resources(
     identifiers: Collection[str],
     fetcher: Callable[[str, httpx.AsyncClient], Coroutine[Any, Any, httpx.Response]],
     url: str = "http://rest.kegg.jp/get/",
-    requests_per_second: int = 10,
-) -> DataFrame:
+    requests_per_second: float = 10,
+    max_concurrency: int = 10,
+    batch_size: int = 1,
+    splitter: Optional[Callable[[Sequence[str], str], Dict[str, str]]] = None,
+    store: Optional[KEGGResponseStore] = None,
+    connect_timeout: float = 10,
+    read_timeout: float = 60,
+    max_retries: int = 5,
+    shared_bucket: Optional[SharedTokenBucket] = None,
+) -> Optional[DataFrame]:
     """
     Fetch large amounts of resources from the KEGG REST API.
 
     The resources are specified via their corresponding identifier and a specific
-    callable that further details the resource.
+    callable that further details the resource. Requests are issued by a bounded pool
+    of worker coroutines which draw from a token bucket. That keeps requests flowing
+    continuously at the desired rate, independent of how long single responses take.
+
+    KEGG allows retrieving up to 10 entries with a single request. When a batch size
+    larger than one is given, identifiers are joined by `+` before being passed to the
+    fetcher and the `splitter` is used to map the combined response back to the
+    individual identifiers. Requested identifiers without an entry in a successful
+    response are recorded with a status code of 404. A batch whose response cannot
+    be split is requested again one identifier at a time.
+
+    Requests that fail due to network errors, time outs, or server errors are
+    repeated a limited number of times after a random delay. Identifiers for which
+    all attempts failed are recorded with the last status code, or zero if no
+    response was received, rather than aborting the whole run. Since such responses
+    are not final, they are requested again when resuming from a store.
 
     Parameters
     ----------
@@ -78,72 +203,197 @@ async def fetch_kegg_resources(
         await the response.
     url : str, optional
         The base URL for the KEGG REST API.
-    requests_per_second : int, optional
+    requests_per_second : float, optional
         The desired requests per second to make. The default of 10 is the desired limit
         by KEGG.
+    max_concurrency : int, optional
+        The maximum number of requests in flight at any time (default 10).
+    batch_size : int, optional
+        The number of identifiers to request together (default 1, maximum 10).
+    splitter : callable, optional
+        Called with the identifiers of a batch and the response body of a successful
+        request. Expected to return a map from identifiers to their entries and to
+        raise a `ValueError` if the response cannot be split. Required if the batch
+        size is larger than one.
+    store : KEGGResponseStore, optional
+        An opened response store. If given, every response is persisted as soon as
+        it is received instead of being kept in memory.
+    connect_timeout : float, optional
+        The number of seconds to wait for establishing a connection (default 10).
+    read_timeout : float, optional
+        The number of seconds to wait for receiving data (default 60). A request that
+        does not complete within the sum of both time outs is cancelled.
+    max_retries : int, optional
+        The maximum number of repetitions of a request after transient failures
+        (default 5).
+    shared_bucket : SharedTokenBucket, optional
+        An opened token bucket shared with other processes on the same host. If
+        given, every request additionally draws from it such that the combined rate
+        of all processes is limited.
 
     Returns
     -------
-    pandas.DataFrame
+    pandas.DataFrame or None
         A data frame with three columns where each row corresponds to one identifier,
-        the HTTP response status code, and the response body.
+        the HTTP response status code, and the response body. Nothing is returned if
+        the responses were written to a store.
 
     See Also
     --------
     etl.kegg_mol_fetcher
     etl.kegg_reaction_fetcher
+    etl.split_kegg_flat_file
+    etl.split_kegg_mol_blocks
 
     """
+    if not 1 <= batch_size <= 10:
+        raise ValueError(f"The batch size must be between 1 and 10, not {batch_size}.")
+    if batch_size > 1 and splitter is None:
+        raise ValueError("A splitter is required in order to request batches.")
     identifiers = list(identifiers)
-    # The design decision is that the go event should be active most of the time and
-    # only inactivated if we need to back off from making requests to the API.
-    go_event = asyncio.Event()
-    go_event.set()
-    # We create a lock so that multiple requests hitting a rate-limit can be
-    # coordinated and the number of requests per second throttled correctly.
-    request_lock = asyncio.Lock()
+    queue = asyncio.Queue()
+    for index in range(0, len(identifiers), batch_size):
+        queue.put_nowait(tuple(identifiers[index : index + batch_size]))
+    # All workers draw from one bucket whose rate adapts to throttling by KEGG.
+    bucket = AdaptiveTokenBucket(rate=requests_per_second)
     results = []
+    num_fetched = 0
+    # The identifiers whose requests failed even after repetitions.
+    failed = []
+    # The number of resources fetched in every minute since the start.
+    per_minute = Counter()
+
+    def record(identifier: str, status_code: int, text: str) -> None:
+        """Keep or persist a single response."""
+        nonlocal num_fetched
+        num_fetched += 1
+        if is_transient(status_code):
+            failed.append(identifier)
+        per_minute[int((time.perf_counter() - start) // 60)] += 1
+        if store is None:
+            results.append((identifier, status_code, text))
+        else:
+            store.append(identifier, status_code, text)
+
+    async def worker(client: httpx.AsyncClient, pbar: tqdm) -> None:
+        """Fetch resources until no more identifiers are queued."""
+        while True:
+            try:
+                batch = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            _, status_code, text = await fetch_resource(
+                "+".join(batch),
+                client,
+                fetcher,
+                bucket,
+                shared_bucket=shared_bucket,
+                deadline=connect_timeout + read_timeout,
+                max_retries=max_retries,
+            )
+            pbar.set_postfix(rate=f"{bucket.rate:.2f}", refresh=False)
+            if len(batch) == 1 or status_code != 200:
+                for identifier in batch:
+                    record(identifier, status_code, text)
+                pbar.update(len(batch))
+                continue
+            try:
+                entries = splitter(batch, text)
+            except ValueError as error:
+                logger.warning(
+                    f"Failed to split the response for {'+'.join(batch)}. Requesting "
+                    f"identifiers individually."
+                )
+                logger.debug("", exc_info=error)
+                for identifier in batch:
+                    queue.put_nowait((identifier,))
+                continue
+            for identifier in batch:
+                if (entry := entries.get(identifier)) is not None:
+                    record(identifier, 200, entry)
+                else:
+                    record(identifier, 404, "")
+            pbar.update(len(batch))
+
+    start = time.perf_counter()
     with tqdm(total=len(identifiers), desc="Fetch Resource") as pbar:
         async with httpx.AsyncClient(
             base_url=url,
-            pool_limits=httpx.Limits(
-                max_keepalive_connections=requests_per_second,
-                max_connections=requests_per_second,
+            limits=httpx.Limits(
+                max_keepalive_connections=max_concurrency,
+                max_connections=max_concurrency,
             ),
-            timeout=None,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
         ) as client:
-            while len(identifiers) > 0:
-                tasks = identifiers[-requests_per_second:]
-                del identifiers[-requests_per_second:]
-                start = time.perf_counter()
-                results.extend(
-                    await asyncio.gather(
-                        *[
-                            fetch_resource(i, client, fetcher, go_event, request_lock)
-                            for i in tasks
-                        ]
-                    )
-                )
-                delta = time.perf_counter() - start
-                # We keep our number of requests per second conservative by always
-                # waiting until the next second window.
-                await asyncio.sleep(ceil(delta) - delta)
-                pbar.update(len(tasks))
+            workers = [
+                asyncio.ensure_future(worker(client, pbar))
+                for _ in range(min(max_concurrency, queue.qsize()))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                # Do not leave any requests dangling when one worker fails.
+                for task in workers:
+                    task.cancel()
+                raise
+    delta = time.perf_counter() - start
+    if delta > 0:
+        logger.info(
+            f"Fetched {num_fetched} resources in {delta:.1f} s "
+            f"({num_fetched / delta:.2f} resources per second)."
+        )
+        # The last minute may have been cut short.
+        achieved = [
+            per_minute[minute] / min(60.0, delta - 60 * minute)
+            for minute in range(int(delta // 60) + 1)
+            if delta > 60 * minute
+        ]
+        logger.info(
+            f"Resources per second in every minute: "
+            f"{', '.join(f'{r:.2f}' for r in achieved)}."
+        )
+    logger.info(
+        f"The request rate was reduced {bucket.num_decreases} time(s) due to "
+        f"throttling and ended at {bucket.rate:.2f} per second."
+    )
+    if failed:
+        logger.warning(
+            f"Gave up on {len(failed)} resource(s) after repeated failures: "
+            f"{', '.join(failed)}."
+        )
+    if store is not None:
+        return
     return DataFrame(data=results, columns=["identifier", "status_code", "response"])
 
 
+def is_transient(status_code: int) -> bool:
+    """Return whether a response status code signals a failure worth retrying."""
+    return (
+        status_code == NETWORK_ERROR_STATUS_CODE
+        or status_code >= 500
+        or status_code in THROTTLING_STATUS_CODES
+    )
+
+
 async def fetch_resource(
     identifier: str,
     client: httpx.AsyncClient,
     fetcher: Callable[[str, httpx.AsyncClient], Coroutine[Any, Any, httpx.Response]],
-    go_event: asyncio.Event,
-    request_lock: asyncio.Lock,
-    base_wait_time: int = 1,
-    exponential_factor: int = 2,
+    bucket: AdaptiveTokenBucket,
+    shared_bucket: Optional[SharedTokenBucket] = None,
+    deadline: Optional[float] = None,
     max_attempts: int = 10,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
 ) -> Tuple[str, int, str]:
     """
-    Fetch a single mol description of a compound from KEGG and convert it to InChI.
+    Fetch a single resource from KEGG at the rate of an adaptive token bucket.
+
+    Throttled requests are repeated at the reduced rate of the bucket. Requests that
+    fail due to network errors, time outs, or server errors are repeated after an
+    exponentially growing delay with random jitter such that many failing requests
+    do not retry in lockstep.
 
     Parameters
     ----------
@@ -154,47 +404,71 @@ async def fetch_resource(
     fetcher : callable
         A coroutine that combines the client and the given identifier for the
         specific resource.
-    go_event : asyncio.Event
-    request_lock : asyncio.Lock
-    base_wait_time : int
-    exponential_factor : int
+    bucket : AdaptiveTokenBucket
+        The token bucket shared by all requests. Its rate is cut whenever a request
+        is throttled and increased with every successful response.
+    shared_bucket : SharedTokenBucket, optional
+        An opened token bucket shared with other processes from which a token is
+        taken for every request in addition to the process' own bucket.
+    deadline : float, optional
+        The number of seconds after which a request is cancelled (default none).
     max_attempts : int, optional
+        The maximum number of attempts when requests are throttled (default 10).
+    max_retries : int, optional
+        The maximum number of repetitions after transient failures (default 5).
+    base_delay : float, optional
+        The upper bound of the random delay before the first repetition in seconds
+        (default 1). It doubles with every further repetition.
+    max_delay : float, optional
+        The largest upper bound of the random delay in seconds (default 60).
 
     Returns
     -------
     tuple
         A triple of the resource identifier, the HTTP response code, and optionally
-        the response body as text.
+        the response body as text. If no response was received, the status code is
+        zero and the text describes the error. The last failure is returned when
+        all attempts are exhausted.
 
     """
-    # If the go event is cleared, i.e., we need to back off, this will halt
-    # making a request until we are good to go again.
-    await go_event.wait()
-    response = await fetcher(identifier, client)
-    if response.status_code == 403:
-        # Clear the event so that no more requests are submitted.
-        go_event.clear()
-        logger.warning(f"{identifier}: Hit API rate limit.")
-        if request_lock.locked():
-            # Some other coroutine is currently handling the backing off. We wait for
-            # the event to go ahead.
-            await go_event.wait()
-            response = await fetcher(identifier, client)
+    num_throttled = 0
+    num_failures = 0
+    while True:
+        await bucket.acquire()
+        if shared_bucket is not None:
+            await shared_bucket.acquire()
+        issued = time.monotonic()
+        try:
+            response = await asyncio.wait_for(fetcher(identifier, client), deadline)
+        except asyncio.TimeoutError:
+            status_code = NETWORK_ERROR_STATUS_CODE
+            text = f"No response within {deadline} s."
+        except httpx.TransportError as error:
+            status_code = NETWORK_ERROR_STATUS_CODE
+            text = f"{type(error).__name__}: {error}"
         else:
-            async with request_lock:
-                # Introduce exponential backing off.
-                wait_time = base_wait_time
-                for attempt in range(max_attempts):
-                    logger.info(f"{identifier}: Trying again in {wait_time} seconds.")
-                    await asyncio.sleep(wait_time)
-                    response = await fetcher(identifier, client)
-                    if response.status_code != 403:
-                        # We are cleared and good to continue.
-                        go_event.set()
-                        break
-                    wait_time *= exponential_factor
-                if (attempt + 1) >= max_attempts:
-                    raise RuntimeError(
-                        "Maximum number of back-off and retry attempts reached. Aborting."
-                    )
-    return identifier, response.status_code, response.text
+            status_code = response.status_code
+            text = response.text
+        if status_code in THROTTLING_STATUS_CODES:
+            bucket.throttled(issued)
+            num_throttled += 1
+            logger.warning(
+                f"{identifier}: Hit API rate limit. Reducing the request rate to "
+                f"{bucket.rate:.2f} per second."
+            )
+            if num_throttled >= max_attempts:
+                return identifier, status_code, text
+            continue
+        if not is_transient(status_code):
+            bucket.succeeded()
+            return identifier, status_code, text
+        num_failures += 1
+        if num_failures > max_retries:
+            return identifier, status_code, text
+        # Full jitter spreads out the repetitions of simultaneously failed requests.
+        delay = random.uniform(0, min(max_delay, base_delay * 2 ** (num_failures - 1)))
+        reason = text if status_code == NETWORK_ERROR_STATUS_CODE else status_code
+        logger.warning(
+            f"{identifier}: Failed with {reason}. Retrying in {delay:.1f} s."
+        )
+        await asyncio.sleep(delay)
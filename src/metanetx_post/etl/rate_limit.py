@@ -0,0 +1,302 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Provide rate limiters for asynchronous requests."""
+
+
+import asyncio
+import random
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+
+__all__ = ("TokenBucket", "AdaptiveTokenBucket", "SharedTokenBucket")
+
+
+class TokenBucket:
+    """
+    Define a token bucket that limits the rate of asynchronous operations.
+
+    Tokens are refilled continuously at the given rate up to the bucket's capacity.
+    Every call to `acquire` consumes one token and waits if none is available. Waiting
+    coroutines are served in the order in which they arrived.
+
+    Attributes
+    ----------
+    rate : float
+        The number of tokens added to the bucket per second.
+    capacity : float
+        The maximum number of tokens that the bucket can hold, i.e., the largest
+        possible burst of operations.
+
+    """
+
+    def __init__(self, *, rate: float, capacity: float = 1.0, **kwargs):
+        """
+        Initialize a full token bucket.
+
+        Parameters
+        ----------
+        rate : float
+            The number of tokens added to the bucket per second.
+        capacity : float, optional
+            The maximum number of tokens that the bucket can hold (default 1). The
+            default spaces operations evenly at intervals of `1 / rate` seconds.
+
+        """
+        super().__init__(**kwargs)
+        if rate <= 0:
+            raise ValueError(f"The rate must be positive, not {rate}.")
+        if capacity < 1:
+            raise ValueError(f"The capacity must be at least one, not {capacity}.")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        # The lock is created lazily such that it binds to the running event loop.
+        self._lock = None
+
+    def _refill(self) -> None:
+        """Add the tokens accumulated since the last refill."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and consume it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # The lock serves waiting coroutines in first-in, first-out order.
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    Define a token bucket whose rate adapts to throttling by a server.
+
+    The rate follows an additive-increase, multiplicative-decrease (AIMD) scheme. It
+    is cut by a factor whenever a request is throttled and probed back up by a
+    constant amount per second of successful requests, but it never exceeds the
+    initial rate. The rate thus converges on the highest sustainable one instead of
+    alternating between stalls and bursts.
+
+    Attributes
+    ----------
+    max_rate : float
+        The initial and highest possible rate.
+    min_rate : float
+        The lowest possible rate.
+    decrease : float
+        The factor by which the rate is multiplied when a request is throttled.
+    increase : float
+        The number of tokens per second by which the rate grows during one second of
+        successful requests.
+    num_decreases : int
+        The number of times that the rate was cut.
+
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: float,
+        min_rate: Optional[float] = None,
+        decrease: float = 0.75,
+        increase: float = 0.25,
+        **kwargs,
+    ):
+        """
+        Initialize a full token bucket at its highest rate.
+
+        Parameters
+        ----------
+        rate : float
+            The initial and highest possible number of tokens added per second.
+        min_rate : float, optional
+            The lowest possible rate (default one hundredth of the rate).
+        decrease : float, optional
+            The factor by which the rate is multiplied when a request is throttled
+            (default 0.75).
+        increase : float, optional
+            The number of tokens per second by which the rate grows during one second
+            of successful requests (default 0.25).
+
+        """
+        super().__init__(rate=rate, **kwargs)
+        if min_rate is None:
+            min_rate = rate / 100
+        if not 0 < min_rate <= rate:
+            raise ValueError(
+                f"The minimum rate must be positive and at most {rate}, not "
+                f"{min_rate}."
+            )
+        if not 0 < decrease < 1:
+            raise ValueError(
+                f"The decrease must be a factor between zero and one, not {decrease}."
+            )
+        if increase <= 0:
+            raise ValueError(f"The increase must be positive, not {increase}.")
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.decrease = decrease
+        self.increase = increase
+        self.num_decreases = 0
+        self._last_decrease = float("-inf")
+
+    def throttled(self, issued: float) -> None:
+        """
+        Cut the rate after a request was throttled.
+
+        Parameters
+        ----------
+        issued : float
+            The time, as given by `time.monotonic`, at which the throttled request was
+            issued. Requests that were issued before the last cut do not cut the rate
+            again since they were sent at the rate that caused it.
+
+        """
+        if issued < self._last_decrease:
+            return
+        self._refill()
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        # Any accumulated tokens would be spent at the excessive rate.
+        self._tokens = min(self._tokens, 0.0)
+        self._last_decrease = time.monotonic()
+        self.num_decreases += 1
+
+    def succeeded(self) -> None:
+        """Increase the rate after a successful request."""
+        self._refill()
+        # With `rate` requests per second, the rate grows by `increase` per second.
+        self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+
+class SharedTokenBucket:
+    """
+    Define a token bucket that is shared by all processes using the same file.
+
+    The state of the bucket is kept in a SQLite database and every acquisition
+    happens in an exclusive transaction. Concurrent processes on the same host thus
+    draw from a single budget such that their combined rate does not exceed the
+    given one. All processes should use the same rate. While another process holds
+    the lock on the bucket, acquisitions wait asynchronously rather than blocking
+    the event loop.
+
+    Attributes
+    ----------
+    path : pathlib.Path
+        The location of the SQLite database.
+    rate : float
+        The number of tokens added to the bucket per second.
+    capacity : float
+        The maximum number of tokens that the bucket can hold.
+
+    """
+
+    def __init__(self, *, path: Path, rate: float, capacity: float = 1.0, **kwargs):
+        """Initialize a shared token bucket whose file need not exist yet."""
+        super().__init__(**kwargs)
+        if rate <= 0:
+            raise ValueError(f"The rate must be positive, not {rate}.")
+        if capacity < 1:
+            raise ValueError(f"The capacity must be at least one, not {capacity}.")
+        self.path = Path(path)
+        self.rate = rate
+        self.capacity = capacity
+        self._connection = None
+        # The lock is created lazily such that it binds to the running event loop.
+        self._lock = None
+
+    def __enter__(self) -> "SharedTokenBucket":
+        """Open the database and create a full bucket unless it exists already."""
+        # Transactions are managed explicitly. Creating the bucket may wait for other
+        # processes since no event loop is blocked yet.
+        self._connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS bucket ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), "
+            "tokens REAL NOT NULL, "
+            "updated REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "INSERT OR IGNORE INTO bucket VALUES (1, ?, ?)",
+            (self.capacity, time.time()),
+        )
+        # From now on, a locked bucket is reported at once such that `acquire` can
+        # wait for it without blocking.
+        self._connection.execute("PRAGMA busy_timeout = 0")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Close the database."""
+        self._connection.close()
+        self._connection = None
+
+    def _take(self) -> Optional[float]:
+        """
+        Take a token if possible and otherwise return the seconds until one is.
+
+        Return `None` if another process holds the lock on the bucket.
+
+        """
+        # An immediate transaction holds the write lock from the start such that no
+        # other process can take the same token.
+        try:
+            self._connection.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as error:
+            if "locked" in str(error):
+                return
+            raise
+        try:
+            tokens, updated = self._connection.execute(
+                "SELECT tokens, updated FROM bucket WHERE id = 1"
+            ).fetchone()
+            # The wall clock is shared between processes, unlike a monotonic one.
+            now = time.time()
+            tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._connection.execute(
+                "UPDATE bucket SET tokens = ?, updated = ? WHERE id = 1", (tokens, now)
+            )
+            self._connection.execute("COMMIT")
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        return wait
+
+    async def acquire(self) -> None:
+        """Wait until a token is available in the shared bucket and consume it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Coroutines of the same process are served in first-in, first-out order.
+        async with self._lock:
+            while (wait := self._take()) != 0:
+                if wait is None:
+                    # Other processes hold the lock only for a single short
+                    # transaction. We retry after a random delay such that they do
+                    # not keep colliding.
+                    wait = random.uniform(0.0, 0.01)
+                await asyncio.sleep(wait)
@@ -0,0 +1,133 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Provide an on-disk store for KEGG REST API responses."""
+
+
+import json
+import logging
+from pathlib import Path
+from typing import Collection, Dict, Iterator, Optional, Set, Tuple
+
+from ..model import KEGGResponseModel
+
+
+__all__ = ("KEGGResponseStore",)
+
+
+logger = logging.getLogger(__name__)
+
+
+class KEGGResponseStore:
+    """
+    Define an append-only store of KEGG REST API responses in JSON Lines format.
+
+    Every response is written as one line as soon as it is received such that an
+    interrupted download can be resumed. When an identifier occurs multiple times,
+    the last response takes precedence.
+
+    Attributes
+    ----------
+    path : pathlib.Path
+        The location of the JSON Lines file.
+
+    """
+
+    # Responses with these status codes need not be requested again.
+    final_status_codes = frozenset({200, 404})
+
+    def __init__(self, *, path: Path, **kwargs):
+        """Initialize a store at the given path which need not exist yet."""
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self._handle = None
+
+    def __enter__(self) -> "KEGGResponseStore":
+        """Open the store for appending responses."""
+        self._handle = self.path.open("a")
+        # Terminate a line that may have been cut short by an interrupted process.
+        if self._handle.tell() > 0:
+            with self.path.open("rb") as handle:
+                handle.seek(-1, 2)
+                if handle.read(1) != b"\n":
+                    self._handle.write("\n")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Close the store."""
+        self._handle.close()
+        self._handle = None
+
+    def append(self, identifier: str, status_code: int, response: str) -> None:
+        """Persist a single response immediately."""
+        self._handle.write(
+            json.dumps(
+                {
+                    "identifier": identifier,
+                    "status_code": status_code,
+                    "response": response,
+                },
+                separators=(",", ":"),
+            )
+        )
+        self._handle.write("\n")
+        self._handle.flush()
+
+    def _iter_records(self) -> Iterator[Tuple[int, Dict]]:
+        """Yield all decodable records and their line numbers in written order."""
+        if not self.path.exists():
+            return
+        with self.path.open() as handle:
+            for line_num, line in enumerate(handle, start=1):
+                try:
+                    yield line_num, json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be incomplete if the process was killed.
+                    logger.warning(
+                        f"Skipping corrupt line {line_num} in '{self.path}'."
+                    )
+
+    def fetched(self) -> Set[str]:
+        """Return the identifiers whose latest response need not be requested again."""
+        latest = {
+            record["identifier"]: record["status_code"]
+            for _, record in self._iter_records()
+        }
+        return {i for i, code in latest.items() if code in self.final_status_codes}
+
+    def iter_responses(
+        self, identifiers: Optional[Collection[str]] = None
+    ) -> Iterator[KEGGResponseModel]:
+        """
+        Yield the latest response for every identifier without loading all of them.
+
+        Parameters
+        ----------
+        identifiers : collection of str, optional
+            Only yield responses for these identifiers (default all).
+
+        """
+        # In a first pass, we only remember where the latest response for each
+        # identifier is located.
+        latest = {
+            record["identifier"]: line_num for line_num, record in self._iter_records()
+        }
+        for line_num, record in self._iter_records():
+            identifier = record["identifier"]
+            if latest.get(identifier) != line_num:
+                continue
+            if identifiers is not None and identifier not in identifiers:
+                continue
+            yield KEGGResponseModel(**record)
@@ -0,0 +1,296 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Provide a persistent cache of computed structure properties and failures."""
+
+
+import hashlib
+import logging
+import sqlite3
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+
+__all__ = ("StructurePropertyCache",)
+
+
+logger = logging.getLogger(__name__)
+
+
+class StructurePropertyCache:
+    """
+    Define an SQLite cache of structure properties computed by a toolkit.
+
+    Entries are keyed by a hash of the input structure, for example, an MDL MOL
+    block, InChI, or SMILES string, together with the name and version of the
+    chem-informatics backend such that upgrading the backend invalidates them. When
+    the cache holds more than the maximum number of entries on closing, the least
+    recently used ones are evicted.
+
+    Structures whose conversion failed are recorded in a ledger together with the
+    backend, its version, and the reason. They are not computed again unless
+    failures should be retried.
+
+    Attributes
+    ----------
+    path : pathlib.Path
+        The location of the SQLite database.
+    backend : str
+        The name of the chem-informatics backend.
+    version : str
+        The version of the chem-informatics backend.
+    max_entries : int
+        The maximum number of entries that are kept.
+    retry_failed : bool
+        Whether to compute structures again that are recorded as failed.
+    statistics : collections.Counter
+        The number of structures that were served from the cache (`hits`), that
+        were computed (`computed`), that were skipped because of a previous failure
+        (`skipped`), and that failed (`failed`).
+
+    """
+
+    fields = ("inchi", "inchi_key", "smiles", "chemical_formula", "mass", "charge")
+
+    # Stay below the SQLite limit on host parameters per statement.
+    _chunk_size = 500
+
+    def __init__(
+        self,
+        *,
+        path: Path,
+        backend: str,
+        version: str,
+        max_entries: int = 1_000_000,
+        retry_failed: bool = False,
+        **kwargs,
+    ):
+        """Initialize a cache at the given path which need not exist yet."""
+        super().__init__(**kwargs)
+        if max_entries < 1:
+            raise ValueError(
+                f"The maximum number of entries must be positive, not {max_entries}."
+            )
+        self.path = Path(path)
+        self.backend = backend
+        self.version = version
+        self.max_entries = max_entries
+        self.retry_failed = retry_failed
+        self.statistics = Counter()
+        self._connection = None
+
+    def __enter__(self) -> "StructurePropertyCache":
+        """Open the cache."""
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS properties ("
+            "key TEXT PRIMARY KEY, "
+            "inchi TEXT, "
+            "inchi_key TEXT, "
+            "smiles TEXT, "
+            "chemical_formula TEXT, "
+            "mass REAL, "
+            "charge INTEGER, "
+            "accessed REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS properties_accessed ON properties (accessed)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS failures ("
+            "key TEXT PRIMARY KEY, "
+            "backend TEXT NOT NULL, "
+            "version TEXT NOT NULL, "
+            "reason TEXT NOT NULL, "
+            "failed REAL NOT NULL)"
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Evict surplus entries and close the cache."""
+        self.evict()
+        self._connection.commit()
+        self._connection.close()
+        self._connection = None
+
+    def _key(self, structure: str) -> str:
+        """Return the key of an input structure for this backend and version."""
+        return hashlib.sha256(
+            "\0".join((self.backend, self.version, structure)).encode()
+        ).hexdigest()
+
+    def _select(self, table: str, columns: str, keys: List[str]) -> List[tuple]:
+        """Return the rows of the table with the given keys in chunks."""
+        rows = []
+        for index in range(0, len(keys), self._chunk_size):
+            chunk = keys[index : index + self._chunk_size]
+            rows.extend(
+                self._connection.execute(
+                    f"SELECT key, {columns} FROM {table} "
+                    f"WHERE key IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+            )
+        return rows
+
+    def get_many(self, structures: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the cached properties of all given structures that are present."""
+        key2structure = {self._key(s): s for s in structures}
+        rows = self._select("properties", ", ".join(self.fields), list(key2structure))
+        now = time.time()
+        self._connection.executemany(
+            "UPDATE properties SET accessed = ? WHERE key = ?",
+            [(now, key) for key, *_ in rows],
+        )
+        self._connection.commit()
+        return {
+            key2structure[key]: dict(zip(self.fields, values)) for key, *values in rows
+        }
+
+    def get_failures(self, structures: Iterable[str]) -> Dict[str, str]:
+        """Return the reasons of all given structures that are recorded as failed."""
+        key2structure = {self._key(s): s for s in structures}
+        return {
+            key2structure[key]: reason
+            for key, reason in self._select("failures", "reason", list(key2structure))
+        }
+
+    def put_failures(self, reasons: Dict[str, str]) -> None:
+        """Record the given structures as failed for the given reasons."""
+        now = time.time()
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO failures (key, backend, version, reason, failed) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (self._key(s), self.backend, self.version, reason, now)
+                for s, reason in reasons.items()
+            ],
+        )
+        self._connection.commit()
+
+    def remove_failures(self, structures: Iterable[str]) -> None:
+        """Remove the given structures from the failure ledger."""
+        self._connection.executemany(
+            "DELETE FROM failures WHERE key = ?", [(self._key(s),) for s in structures]
+        )
+        self._connection.commit()
+
+    def put_many(self, properties: Dict[str, Dict[str, Any]]) -> None:
+        """Store the properties of the given structures."""
+        now = time.time()
+        self._connection.executemany(
+            f"INSERT OR REPLACE INTO properties (key, {', '.join(self.fields)}, "
+            f"accessed) VALUES ({', '.join('?' * (len(self.fields) + 2))})",
+            [
+                (self._key(s), *(props.get(f) for f in self.fields), now)
+                for s, props in properties.items()
+            ],
+        )
+        self._connection.commit()
+
+    def get_or_compute(
+        self,
+        structures: Sequence[str],
+        compute: Callable[[List[Any]], Iterable[Union[Dict[str, Any], str, None]]],
+        jobs: Optional[Sequence[Any]] = None,
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Return the properties of all structures and only compute the uncached ones.
+
+        Structures that are recorded as failed are not computed again unless
+        failures should be retried.
+
+        Parameters
+        ----------
+        structures : sequence of str
+            The input structures.
+        compute : callable
+            A function that receives a list of jobs and returns the properties for
+            each one or, if they could not be computed, the reason as a string.
+        jobs : sequence, optional
+            The arguments for computing each structure's properties (default the
+            structures themselves).
+
+        Returns
+        -------
+        list
+            The properties in the order of the given structures or `None` for
+            failures.
+
+        """
+        if jobs is None:
+            jobs = structures
+        cached = self.get_many(structures)
+        failed = {}
+        if not self.retry_failed:
+            failed = self.get_failures(s for s in structures if s not in cached)
+        missing = [
+            i for i, s in enumerate(structures) if s not in cached and s not in failed
+        ]
+        computed = {}
+        reasons = {}
+        for index, result in zip(missing, compute([jobs[i] for i in missing])):
+            if isinstance(result, dict):
+                computed[structures[index]] = result
+            else:
+                reasons[structures[index]] = result or "Unknown reason."
+        self.put_many(computed)
+        self.put_failures(reasons)
+        if self.retry_failed:
+            self.remove_failures(computed)
+        self.statistics.update(
+            hits=len(cached),
+            skipped=len(failed),
+            computed=len(computed),
+            failed=len(reasons),
+        )
+        return [cached.get(s, computed.get(s)) for s in structures]
+
+    def summarize(self) -> None:
+        """Log the statistics of this session and the content of the failure ledger."""
+        logger.info(
+            f"Structures: {self.statistics['hits']} cached, "
+            f"{self.statistics['computed']} computed, "
+            f"{self.statistics['failed']} failed, "
+            f"{self.statistics['skipped']} skipped because of previous failures."
+        )
+        rows = self._connection.execute(
+            "SELECT reason, COUNT(*) FROM failures WHERE backend = ? AND version = ? "
+            "GROUP BY reason ORDER BY COUNT(*) DESC",
+            (self.backend, self.version),
+        ).fetchall()
+        total = sum(num for _, num in rows)
+        logger.info(
+            f"The failure ledger contains {total} structures for {self.backend} "
+            f"{self.version}."
+        )
+        for reason, num in rows:
+            logger.info(f"{reason}: {num} ({num / total:.2%})")
+
+    def evict(self) -> None:
+        """Remove the least recently used entries beyond the maximum number."""
+        (count,) = self._connection.execute(
+            "SELECT COUNT(*) FROM properties"
+        ).fetchone()
+        if count <= self.max_entries:
+            return
+        self._connection.execute(
+            "DELETE FROM properties WHERE key IN ("
+            "SELECT key FROM properties ORDER BY accessed LIMIT ?)",
+            (count - self.max_entries,),
+        )
+        logger.info(f"Evicted {count - self.max_entries} cached structures.")
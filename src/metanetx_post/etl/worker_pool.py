@@ -0,0 +1,290 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Provide a pool of isolated worker processes with a deadline per item."""
+
+
+import logging
+import multiprocessing
+import time
+from contextlib import nullcontext
+from functools import partial
+from multiprocessing.connection import Connection, wait
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+
+__all__ = ("IsolatedWorkerPool", "create_worker_map")
+
+
+logger = logging.getLogger(__name__)
+
+
+def _work(
+    connection: Connection,
+    initializer: Optional[Callable[..., None]],
+    initargs: Tuple,
+) -> None:
+    """Apply the received functions to the received items until told to stop."""
+    if initializer is not None:
+        initializer(*initargs)
+    while (task := connection.recv()) is not None:
+        func, item = task
+        try:
+            connection.send((True, func(item)))
+        except Exception as error:
+            connection.send((False, error))
+
+
+class _Worker:
+    """Define a worker process and the main process' end of its pipe."""
+
+    def __init__(
+        self,
+        initializer: Optional[Callable[..., None]],
+        initargs: Tuple,
+        **kwargs,
+    ):
+        """Start a new worker process."""
+        super().__init__(**kwargs)
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_work, args=(child, initializer, initargs), daemon=True
+        )
+        self.process.start()
+        child.close()
+
+    def stop(self) -> None:
+        """Ask the worker to exit and kill it if it does not."""
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self) -> None:
+        """Kill the worker process immediately."""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class IsolatedWorkerPool:
+    """
+    Define a pool of worker processes that each handle one item at a time.
+
+    Unlike `multiprocessing.Pool`, a worker that exceeds the deadline for an item, or
+    that dies, is killed and replaced such that a single pathological item cannot
+    stall the whole computation.
+
+    Attributes
+    ----------
+    processes : int
+        The number of worker processes.
+    timeout : float
+        The number of seconds that a worker may spend on a single item.
+    offenders : list
+        The items whose processing exceeded the deadline.
+
+    """
+
+    def __init__(
+        self,
+        *,
+        processes: int,
+        timeout: float,
+        initializer: Optional[Callable[..., None]] = None,
+        initargs: Tuple = (),
+        **kwargs,
+    ):
+        """Initialize the pool without starting any workers yet."""
+        super().__init__(**kwargs)
+        if processes < 1:
+            raise ValueError(
+                f"The number of processes must be positive, not {processes}."
+            )
+        if timeout <= 0:
+            raise ValueError(f"The timeout must be positive, not {timeout}.")
+        self.processes = processes
+        self.timeout = timeout
+        self.offenders = []
+        self._initializer = initializer
+        self._initargs = initargs
+        self._workers: List[_Worker] = []
+
+    def __enter__(self) -> "IsolatedWorkerPool":
+        """Start the worker processes."""
+        self._workers = [
+            _Worker(self._initializer, self._initargs) for _ in range(self.processes)
+        ]
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Stop all worker processes."""
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+    def _replace(self, worker: _Worker) -> None:
+        """Kill a worker and start a new one in its place."""
+        worker.kill()
+        self._workers[self._workers.index(worker)] = _Worker(
+            self._initializer, self._initargs
+        )
+
+    def imap(
+        self,
+        func: Callable[[Any], Any],
+        items: Iterable[Any],
+        default: Any = None,
+        crashed: Any = None,
+    ) -> Iterator[Any]:
+        """
+        Apply the function to every item and yield the results in order.
+
+        Parameters
+        ----------
+        func : callable
+            A picklable function of one argument.
+        items : iterable
+            The arguments. They are consumed lazily as workers become idle.
+        default : optional
+            The result for items whose processing exceeded the deadline (default
+            `None`).
+        crashed : optional
+            The result for items whose worker died (default `None`).
+
+        """
+        pending = iter(items)
+        exhausted = False
+        # Maps busy workers to the index of their item, the item, and the deadline.
+        busy: Dict[_Worker, Tuple[int, Any, float]] = {}
+        results = {}
+        num_submitted = 0
+        num_yielded = 0
+        try:
+            while True:
+                for worker in [w for w in self._workers if w not in busy]:
+                    try:
+                        item = next(pending)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    worker.connection.send((func, item))
+                    deadline = time.monotonic() + self.timeout
+                    busy[worker] = (num_submitted, item, deadline)
+                    num_submitted += 1
+                while num_yielded in results:
+                    yield results.pop(num_yielded)
+                    num_yielded += 1
+                if not busy:
+                    if exhausted:
+                        return
+                    continue
+                next_deadline = min(deadline for *_, deadline in busy.values())
+                ready = wait(
+                    [w.connection for w in busy],
+                    timeout=max(0.0, next_deadline - time.monotonic()),
+                )
+                now = time.monotonic()
+                for worker, (index, item, deadline) in list(busy.items()):
+                    if worker.connection in ready:
+                        try:
+                            success, value = worker.connection.recv()
+                        except EOFError:
+                            logger.error(
+                                f"A worker died while processing item {index}."
+                            )
+                            self._replace(worker)
+                            results[index] = crashed
+                        else:
+                            if not success:
+                                raise value
+                            results[index] = value
+                    elif deadline <= now:
+                        logger.warning(
+                            f"Killing a worker that exceeded {self.timeout} s on item "
+                            f"{index}."
+                        )
+                        self._replace(worker)
+                        self.offenders.append(item)
+                        results[index] = default
+                    else:
+                        continue
+                    del busy[worker]
+        finally:
+            # Workers that are still busy when the iteration is abandoned would
+            # later send results that belong to no one.
+            for worker in busy:
+                if worker in self._workers:
+                    self._replace(worker)
+
+
+def create_worker_map(
+    func: Callable[[Any], Any],
+    processes: int = 1,
+    chunk_size: int = 100,
+    timeout: Optional[float] = None,
+    default: Any = None,
+    crashed: Any = None,
+) -> Tuple[ContextManager, Callable[[Iterable[Any]], Iterable[Any]]]:
+    """
+    Return a context for worker processes and a function mapping over them.
+
+    Parameters
+    ----------
+    func : callable
+        A picklable function of one argument.
+    processes : int, optional
+        The number of processes to distribute the items over (default 1). A single
+        process without a timeout maps the items in the current process.
+    chunk_size : int, optional
+        The number of items sent to a worker process at a time (default 100). It is
+        ignored with a timeout, where every item is sent on its own.
+    timeout : float, optional
+        The number of seconds that a single item may take. If given, the items are
+        processed by an `IsolatedWorkerPool`.
+    default : optional
+        The result for items whose processing exceeded the timeout (default `None`).
+    crashed : optional
+        The result for items whose worker died with a timeout (default `None`).
+
+    Returns
+    -------
+    tuple
+        The context manager that starts and stops the worker processes, which is the
+        `IsolatedWorkerPool` itself if a timeout is given, and a function that
+        applies `func` to a list of items and returns the results in order.
+
+    """
+    if timeout is not None:
+        pool = IsolatedWorkerPool(processes=processes, timeout=timeout)
+        return pool, partial(pool.imap, func, default=default, crashed=crashed)
+    if processes > 1:
+        pool = multiprocessing.Pool(processes=processes)
+        # `imap` yields results in the order of submission.
+        return pool, partial(pool.imap, func, chunksize=chunk_size)
+    return nullcontext(), partial(map, func)
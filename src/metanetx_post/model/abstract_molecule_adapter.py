@@ -19,7 +19,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Any, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 
 __all__ = ("AbstractMoleculeAdapter",)
@@ -34,11 +34,32 @@ class AbstractMoleculeAdapter(ABC):
 
     """
 
+    # The properties that can be computed and the methods that compute them.
+    properties = {
+        "inchi": "get_inchi",
+        "inchi_key": "get_inchi_key",
+        "smiles": "get_smiles",
+        "chemical_formula": "get_chemical_formula",
+        "mass": "get_molecular_mass",
+        "charge": "get_charge",
+    }
+
+    # The properties that agree with the values read directly from the layers of an
+    # InChI, see `metanetx_post.etl.parse_inchi_formula_and_charge`. The formula is
+    # formatted differently by each toolkit.
+    inchi_layer_properties = ("charge",)
+
     def __init__(self, *, molecule: Any, **kwargs):
         """"""
         super().__init__(**kwargs)
         self._molecule = molecule
 
+    @classmethod
+    @abstractmethod
+    def get_backend(cls) -> Tuple[str, str]:
+        """Return the name and version of the chem-informatics library."""
+        pass
+
     @classmethod
     @abstractmethod
     def from_mol_block(cls, mol: str) -> Optional[AbstractMoleculeAdapter]:
@@ -86,3 +107,57 @@ class AbstractMoleculeAdapter(ABC):
     def get_charge(self) -> int:
         """Return the molecule's formal charge."""
         pass
+
+    def compute_properties(self, fields: Iterable[str]) -> Dict[str, Any]:
+        """
+        Return the requested properties of the molecule.
+
+        Backends should override this method to compute all properties in a single
+        pass, for example, by reusing an InChI for generating the InChIKey.
+
+        Parameters
+        ----------
+        fields : iterable of str
+            Any of the keys of `properties`.
+
+        Returns
+        -------
+        dict
+            A map from the requested fields to their values.
+
+        """
+        return {field: getattr(self, self.properties[field])() for field in fields}
+
+    @classmethod
+    def compute_many(
+        cls,
+        structures: Iterable[str],
+        fields: Iterable[str] = tuple(properties),
+        kind: str = "inchi",
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Return the requested properties of each structure.
+
+        Parameters
+        ----------
+        structures : iterable of str
+            The input structures.
+        fields : iterable of str, optional
+            Any of the keys of `properties` (default all).
+        kind : {"inchi", "smiles", "mol_block"}, optional
+            The format of the input structures (default InChI).
+
+        Returns
+        -------
+        list
+            The properties of each structure in order or `None` if a molecule could
+            not be created from it.
+
+        """
+        parse = getattr(cls, f"from_{kind}")
+        fields = tuple(fields)
+        result = []
+        for structure in structures:
+            molecule = parse(structure)
+            result.append(molecule.compute_properties(fields) if molecule else None)
+        return result
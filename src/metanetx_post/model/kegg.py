@@ -16,12 +16,12 @@
 """Provide KEGG data models."""
 
 
-from typing import List
+from typing import Dict, List
 
 from pydantic import BaseModel
 
 
-__all__ = ("KEGGResponsesModel", "KEGGResponseModel")
+__all__ = ("KEGGResponsesModel", "KEGGResponseModel", "KEGGManifestModel")
 
 
 class KEGGResponseModel(BaseModel):
@@ -36,3 +36,10 @@ class KEGGResponsesModel(BaseModel):
     """Define a data model for a KEGG REST API response collection."""
 
     __root__: List[KEGGResponseModel]
+
+
+class KEGGManifestModel(BaseModel):
+    """Define a data model for the state of KEGG databases at the time of download."""
+
+    release: str
+    entries: Dict[str, str]
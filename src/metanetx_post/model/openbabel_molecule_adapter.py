@@ -19,7 +19,7 @@
 from __future__ import annotations
 
 import logging
-from typing import Optional
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 from openbabel import openbabel as ob
 from openbabel import pybel
@@ -35,6 +35,10 @@ ob.obErrorLog.SetOutputLevel(-1)
 logger = logging.getLogger(__name__)
 
 
+# The Open Babel output formats of the string representations.
+OUTPUT_FORMATS = {"inchi": "inchi", "inchi_key": "inchikey", "smiles": "smiles"}
+
+
 class OpenBabelMoleculeAdapter(AbstractMoleculeAdapter):
     """
     Define the Open Babel molecule adapter.
@@ -48,6 +52,11 @@ class OpenBabelMoleculeAdapter(AbstractMoleculeAdapter):
         """"""
         super().__init__(molecule=molecule, **kwargs)
 
+    @classmethod
+    def get_backend(cls) -> Tuple[str, str]:
+        """Return the name and version of the chem-informatics library."""
+        return "openbabel", ob.OBReleaseVersion()
+
     @classmethod
     def from_mol_block(cls, mol: str) -> Optional[OpenBabelMoleculeAdapter]:
         """Return an OpenBabelMoleculeAdapter instance from an MDL MOL block."""
@@ -104,3 +113,18 @@ class OpenBabelMoleculeAdapter(AbstractMoleculeAdapter):
     def get_charge(self) -> int:
         """Return the molecule's formal charge."""
         return self._molecule.charge
+
+    def compute_properties(self, fields: Iterable[str]) -> Dict[str, Any]:
+        """Return the requested properties of the molecule in a single pass."""
+        # Unlike `pybel.Molecule.write`, we reuse one conversion for all string
+        # representations. Open Babel does not expose deriving an InChIKey from an
+        # existing InChI, thus the key is still generated from the molecule.
+        conversion = ob.OBConversion()
+        result = {}
+        for field in fields:
+            if field in OUTPUT_FORMATS:
+                conversion.SetOutFormat(OUTPUT_FORMATS[field])
+                result[field] = conversion.WriteString(self._molecule.OBMol).strip()
+            else:
+                result[field] = getattr(self, self.properties[field])()
+        return result
@@ -19,9 +19,10 @@
 from __future__ import annotations
 
 import logging
-from typing import Optional
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 import rdkit.Chem as chem
+from rdkit import rdBase
 from rdkit.Chem import Descriptors, rdMolDescriptors, rdmolops
 from rdkit.Chem.inchi import InchiReadWriteError
 
@@ -34,10 +35,17 @@ logger = logging.getLogger(__name__)
 class RDKitMoleculeAdapter(AbstractMoleculeAdapter):
     """Define the RDKit molecule adapter."""
 
+    inchi_layer_properties = ("chemical_formula", "charge")
+
     def __init__(self, *, molecule: chem.rdkit.Mol, **kwargs):
         """"""
         super().__init__(molecule=molecule, **kwargs)
 
+    @classmethod
+    def get_backend(cls) -> Tuple[str, str]:
+        """Return the name and version of the chem-informatics library."""
+        return "rdkit", rdBase.rdkitVersion
+
     @classmethod
     def from_mol_block(cls, mol: str) -> Optional[RDKitMoleculeAdapter]:
         """Return an RDKitMoleculeAdapter instance from an MDL MOL block."""
@@ -95,3 +103,24 @@ class RDKitMoleculeAdapter(AbstractMoleculeAdapter):
     def get_charge(self) -> int:
         """Return the molecule's formal charge."""
         return rdmolops.GetFormalCharge(self._molecule)
+
+    def compute_properties(self, fields: Iterable[str]) -> Dict[str, Any]:
+        """Return the requested properties of the molecule in a single pass."""
+        fields = tuple(fields)
+        inchi = None
+        if "inchi" in fields or "inchi_key" in fields:
+            inchi = chem.MolToInchi(self._molecule)
+        result = {}
+        for field in fields:
+            if field == "inchi":
+                result[field] = inchi
+            elif field == "inchi_key":
+                # Deriving the key from the InChI avoids generating it a second time.
+                result[field] = (
+                    chem.InchiToInchiKey(inchi)
+                    if inchi
+                    else chem.MolToInchiKey(self._molecule)
+                )
+            else:
+                result[field] = getattr(self, self.properties[field])()
+        return result
@@ -0,0 +1,88 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Provide shared test fixtures."""
+
+
+from importlib import import_module
+
+import pytest
+from cobra_component_models.orm import Base, Namespace
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+Session = sessionmaker()
+
+
+MOLECULE_ADAPTERS = {
+    "rdkit": ("rdkit_molecule_adapter", "RDKitMoleculeAdapter"),
+    "openbabel": ("openbabel_molecule_adapter", "OpenBabelMoleculeAdapter"),
+}
+
+
+def _create_session(url: str):
+    """Create a session bound to an empty database with the test namespaces."""
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    session = Session(bind=engine)
+    session.add_all(
+        [
+            Namespace(
+                miriam_id=f"MIR:{index:08d}",
+                prefix=prefix,
+                pattern=r"^.+$",
+            )
+            for index, prefix in enumerate(
+                [
+                    "kegg.compound",
+                    "kegg.glycan",
+                    "kegg.drug",
+                    "kegg.reaction",
+                    "bigg.reaction",
+                    "seed.reaction",
+                    "ec-code",
+                ],
+                start=1,
+            )
+        ]
+    )
+    session.commit()
+    return session
+
+
+@pytest.fixture()
+def session():
+    """Provide a session bound to an empty in-memory SQLite database."""
+    session = _create_session("sqlite://")
+    yield session
+    session.close()
+
+
+@pytest.fixture()
+def file_session(tmp_path):
+    """Provide a session bound to an empty SQLite database file."""
+    session = _create_session(f"sqlite:///{tmp_path / 'test.db'}")
+    yield session
+    session.close()
+    session.bind.dispose()
+
+
+@pytest.fixture(scope="module", params=list(MOLECULE_ADAPTERS))
+def molecule_adapter(request):
+    """Provide each molecule adapter whose backend is installed."""
+    pytest.importorskip(request.param)
+    module, name = MOLECULE_ADAPTERS[request.param]
+    return getattr(import_module(f"metanetx_post.model.{module}"), name)
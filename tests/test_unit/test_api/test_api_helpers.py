@@ -0,0 +1,112 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of API helper functions."""
+
+
+import asyncio
+
+import pytest
+
+from metanetx_post.api import get_kegg_release
+from metanetx_post.api import helpers as api_helpers
+from metanetx_post.api import (
+    read_kegg_responses,
+    select_kegg_identifiers,
+    update_kegg_manifest,
+    write_kegg_responses,
+)
+from metanetx_post.etl import KEGGResponseStore
+from metanetx_post.model import KEGGManifestModel, KEGGResponseModel
+
+
+def test_get_kegg_release():
+    """Expect the release statement to be extracted from the KEGG information."""
+    info = (
+        "kegg             Kyoto Encyclopedia of Genes and Genomes\n"
+        "kegg             Release 108.0+/10-17, Oct 23\n"
+    )
+    assert get_kegg_release(info) == "Release 108.0+/10-17, Oct 23"
+
+
+def test_select_kegg_identifiers(tmp_path):
+    """Expect only new and, optionally, changed entries to be selected."""
+    store = KEGGResponseStore(path=tmp_path / "responses.jsonl")
+    with store:
+        store.append("C00001", 200, "mol")
+        store.append("C00002", 200, "mol")
+    manifest = KEGGManifestModel(
+        release="Release 1", entries={"C00001": "Water", "C00002": "ATP"}
+    )
+    entries = {"C00001": "H2O; Water", "C00002": "ATP", "C00003": "NAD+"}
+    assert select_kegg_identifiers(entries, "Release 2", store, manifest) == [
+        "C00003"
+    ]
+    assert select_kegg_identifiers(
+        entries, "Release 2", store, manifest, refresh_changed=True
+    ) == ["C00003", "C00001"]
+
+
+def test_update_kegg_manifest(tmp_path):
+    """Expect only the descriptions of fetched entries to be advanced."""
+    previous = KEGGManifestModel(
+        release="Release 1",
+        entries={"C00001": "Water", "C00002": "ADP", "C00009": "Removed"},
+    )
+    entries = {"C00001": "H2O; Water", "C00002": "ATP", "C00003": "NAD+"}
+    manifest = update_kegg_manifest(entries, "Release 2", {"C00002"}, previous)
+    assert manifest.release == "Release 2"
+    assert manifest.entries == {"C00001": "Water", "C00002": "ATP", "C00003": "NAD+"}
+    store = KEGGResponseStore(path=tmp_path / "responses.jsonl")
+    with store:
+        for identifier in entries:
+            store.append(identifier, 200, "mol")
+    # The change that was not fetched is still detected by the next run.
+    assert select_kegg_identifiers(
+        entries, "Release 2", store, manifest, refresh_changed=True
+    ) == ["C00001"]
+
+
+def test_extract_kegg_resources_closes_loop(monkeypatch):
+    """Expect the event loop to be closed even if fetching fails."""
+    loops = []
+    new_event_loop = asyncio.new_event_loop
+
+    def record_event_loop():
+        loops.append(new_event_loop())
+        return loops[-1]
+
+    async def fetch_kegg_entries(*args, **kwargs):
+        raise RuntimeError("KEGG is unavailable.")
+
+    monkeypatch.setattr(asyncio, "new_event_loop", record_event_loop)
+    monkeypatch.setattr(api_helpers, "fetch_kegg_entries", fetch_kegg_entries)
+    with pytest.raises(RuntimeError):
+        api_helpers.extract_kegg_resources(["reaction"], None, None)
+    assert len(loops) == 1 and loops[0].is_closed()
+
+
+@pytest.mark.parametrize(
+    "filename", ["responses.json", "responses.jsonl", "responses.jsonl.gz"]
+)
+def test_kegg_responses_round_trip(tmp_path, filename):
+    """Expect responses to be read back in the format they were written."""
+    responses = [
+        KEGGResponseModel(identifier="R00001", status_code=200, response="a\nb"),
+        KEGGResponseModel(identifier="R00002", status_code=404, response=""),
+    ]
+    path = tmp_path / filename
+    write_kegg_responses(iter(responses), path)
+    assert list(read_kegg_responses(path)) == responses
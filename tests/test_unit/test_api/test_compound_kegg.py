@@ -0,0 +1,281 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of the KEGG compound API."""
+
+import pandas as pd
+import pytest
+from cobra_component_models.orm import (
+    Compound,
+    CompoundAnnotation,
+    Namespace,
+    Participant,
+    Reaction,
+)
+
+from metanetx_post.api import helpers as api_helpers
+from metanetx_post.api.compound import kegg as kegg_api
+from metanetx_post.etl import StructurePropertyCache
+from metanetx_post.model import KEGGResponseModel
+
+
+def test_extract_targeted(session, monkeypatch):
+    """Expect only compounds without InChI to be fetched, most referenced first."""
+    kegg_ns = session.query(Namespace).filter_by(prefix="kegg.compound").one()
+    compounds = [Compound(), Compound(), Compound(inchi="InChI=1S/H2O/h1H2")]
+    for identifier, compound in zip(["C00001", "C00002", "C00003"], compounds):
+        compound.annotation.append(
+            CompoundAnnotation(identifier=identifier, namespace=kegg_ns)
+        )
+    reactions = [Reaction(), Reaction()]
+    session.add_all(compounds + reactions)
+    session.flush()
+    session.add_all(
+        Participant(
+            reaction_id=reaction.id,
+            compound_id=compound.id,
+            stoichiometry="1",
+            is_product=False,
+        )
+        for reaction in reactions
+        for compound in compounds[1:]
+    )
+    session.commit()
+    requested = []
+
+    async def fetch_kegg_resources(identifiers, *args, **kwargs):
+        requested.extend(identifiers)
+        return pd.DataFrame(
+            {"identifier": identifiers, "status_code": 404, "response": ""}
+        )
+
+    async def fetch_kegg_entries(*args, **kwargs):
+        raise AssertionError("The KEGG lists should not be requested.")
+
+    monkeypatch.setattr(api_helpers, "fetch_kegg_resources", fetch_kegg_resources)
+    monkeypatch.setattr(api_helpers, "fetch_kegg_entries", fetch_kegg_entries)
+    responses = list(kegg_api.extract(session=session))
+    assert requested == ["C00002", "C00001"]
+    assert [r.identifier for r in responses] == ["C00002", "C00001"]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_load(session, streaming):
+    """Expect new, conflicting, and duplicate KEGG InChIs to be told apart."""
+    kegg_ns = session.query(Namespace).filter_by(prefix="kegg.compound").one()
+
+    def add(identifiers, inchi=None):
+        compound = Compound(inchi=inchi)
+        compound.annotation.extend(
+            CompoundAnnotation(identifier=i, namespace=kegg_ns) for i in identifiers
+        )
+        session.add(compound)
+        return compound
+
+    new = add(["C00001"])
+    ambiguous = add(["C00002", "C00003"])
+    existing = add(["C00004"])
+    add([], inchi="InChI=1S/B")
+    first = add(["C00005"])
+    second = add(["C00006"])
+    unknown = add(["C00007"])
+    session.commit()
+    report = kegg_api.load(
+        session,
+        {
+            "C00001": "InChI=1S/A",
+            "C00002": "InChI=1S/A2",
+            "C00003": "InChI=1S/A3",
+            "C00004": "InChI=1S/B",
+            "C00005": "InChI=1S/D",
+            "C00006": "InChI=1S/D",
+        },
+        batch_size=2,
+        streaming=streaming,
+    )
+    session.expire_all()
+    assert new.inchi == "InChI=1S/A"
+    assert [c.candidate_compound.id for c in report.conflicts] == [
+        str(ambiguous.id),
+        str(existing.id),
+    ]
+    assert sorted(report.conflicts[0].kegg_inchis) == ["InChI=1S/A2", "InChI=1S/A3"]
+    assert len(report.conflicts[1].existing_compounds) == 1
+    assert [c.id for c in report.duplicates["InChI=1S/D"]] == [
+        str(first.id),
+        str(second.id),
+    ]
+    assert first.inchi is None and second.inchi is None and unknown.inchi is None
+
+
+def test_load_shared_inchi(session, monkeypatch):
+    """Expect every existing compound with a conflicting InChI to be reported."""
+    kegg_ns = session.query(Namespace).filter_by(prefix="kegg.compound").one()
+    candidate = Compound()
+    candidate.annotation.append(
+        CompoundAnnotation(identifier="C00001", namespace=kegg_ns)
+    )
+    existing = Compound(inchi="InChI=1S/B")
+    session.add_all([candidate, existing])
+    session.commit()
+    query_compounds = kegg_api._query_compounds
+
+    def query_shared(session, criterion):
+        # The test schema enforces unique InChIs such that the compound sharing
+        # the InChI is not persisted.
+        compounds = query_compounds(session, criterion)
+        return compounds + [
+            Compound(id=1000, inchi=c.inchi) for c in compounds if c.inchi
+        ]
+
+    monkeypatch.setattr(kegg_api, "_query_compounds", query_shared)
+    report = kegg_api.load(session, {"C00001": "InChI=1S/B"})
+    assert len(report.conflicts) == 1
+    assert [c.id for c in report.conflicts[0].existing_compounds] == [
+        str(existing.id),
+        "1000",
+    ]
+
+
+def test_load_structures(session):
+    """Expect all missing structure columns to be added together with the InChI."""
+    kegg_ns = session.query(Namespace).filter_by(prefix="kegg.compound").one()
+    compound = Compound(chemical_formula="given")
+    compound.annotation.append(
+        CompoundAnnotation(identifier="C00001", namespace=kegg_ns)
+    )
+    session.add(compound)
+    session.commit()
+    kegg_api.load(
+        session,
+        {
+            "C00001": {
+                "inchi": "InChI=1S/H2O/h1H2",
+                "inchi_key": "XLYOFNOQVPJJNP-UHFFFAOYSA-N",
+                "smiles": "O",
+                "chemical_formula": "H2O",
+                "mass": 18.015,
+                "charge": 0,
+            }
+        },
+    )
+    session.expire_all()
+    assert compound.inchi == "InChI=1S/H2O/h1H2"
+    assert compound.inchi_key == "XLYOFNOQVPJJNP-UHFFFAOYSA-N"
+    assert compound.smiles == "O"
+    assert compound.chemical_formula == "given"
+    assert compound.mass == pytest.approx(18.015)
+    assert compound.charge == 0
+
+
+@pytest.fixture(scope="module")
+def responses():
+    """Provide KEGG responses including failures and invalid MOL blocks."""
+    chem = pytest.importorskip("rdkit.Chem")
+    blocks = [chem.MolToMolBlock(chem.MolFromSmiles(s)) for s in ["O", "CCO", "N"]]
+    result = [
+        KEGGResponseModel(
+            identifier=f"C{i:05d}", status_code=200, response=blocks[i % len(blocks)]
+        )
+        for i in range(30)
+    ]
+    result.append(KEGGResponseModel(identifier="C99998", status_code=404, response=""))
+    result.append(
+        KEGGResponseModel(identifier="C99999", status_code=200, response="garbage")
+    )
+    return result
+
+
+def test_transform_parallel(responses):
+    """Expect identical, ordered results regardless of the number of processes."""
+    from metanetx_post.model.rdkit_molecule_adapter import RDKitMoleculeAdapter
+
+    serial = kegg_api.transform(iter(responses), RDKitMoleculeAdapter)
+    parallel = kegg_api.transform(
+        iter(responses), RDKitMoleculeAdapter, processes=2, chunk_size=4
+    )
+    assert len(serial) == 30
+    assert serial["C00000"]["inchi_key"] == "XLYOFNOQVPJJNP-UHFFFAOYSA-N"
+    assert serial["C00001"]["chemical_formula"] == "C2H6O"
+    assert list(parallel.items()) == list(serial.items())
+
+
+def test_transform_deduplication(responses, monkeypatch):
+    """Expect MOL blocks differing only in their header to be converted once."""
+    from metanetx_post.model.rdkit_molecule_adapter import RDKitMoleculeAdapter
+
+    expected = kegg_api.transform(iter(responses), RDKitMoleculeAdapter)
+    renamed = [
+        r.copy(
+            update={
+                "response": "\n".join(
+                    [r.identifier, "  test", ""] + r.response.split("\n")[3:]
+                )
+            }
+        )
+        if r.response.startswith("\n")
+        else r
+        for r in responses
+    ]
+    converted = []
+    from_mol_block = RDKitMoleculeAdapter.from_mol_block
+    monkeypatch.setattr(
+        RDKitMoleculeAdapter,
+        "from_mol_block",
+        lambda mol: converted.append(mol) or from_mol_block(mol),
+    )
+    assert kegg_api.transform(iter(renamed), RDKitMoleculeAdapter) == expected
+    # Three distinct structures and one invalid MOL block.
+    assert len(converted) == 4
+
+
+def test_transform_timeout(responses, tmp_path):
+    """Expect isolated workers to yield the same InChIs as a regular pool."""
+    from metanetx_post.model.rdkit_molecule_adapter import RDKitMoleculeAdapter
+
+    expected = kegg_api.transform(iter(responses), RDKitMoleculeAdapter)
+    with StructurePropertyCache(
+        path=tmp_path / "cache.db", backend="rdkit", version="test"
+    ) as cache:
+        result = kegg_api.transform(
+            iter(responses), RDKitMoleculeAdapter, processes=2, timeout=10
+        )
+        cached = kegg_api.transform(
+            iter(responses), RDKitMoleculeAdapter, cache=cache, timeout=10
+        )
+    assert list(result.items()) == list(expected.items())
+    assert list(cached.items()) == list(expected.items())
+
+
+def test_transform_cache(responses, tmp_path):
+    """Expect cached conversions to yield the same InChIs as fresh ones."""
+    from metanetx_post.model.rdkit_molecule_adapter import RDKitMoleculeAdapter
+
+    expected = kegg_api.transform(iter(responses), RDKitMoleculeAdapter)
+    for _ in range(2):
+        with StructurePropertyCache(
+            path=tmp_path / "cache.db", backend="rdkit", version="test"
+        ) as cache:
+            result = kegg_api.transform(
+                iter(responses), RDKitMoleculeAdapter, cache=cache
+            )
+        assert list(result.items()) == list(expected.items())
+    # The cache is keyed by the digests of the MOL blocks.
+    digests = [kegg_api._hash_mol_block(r.response) for r in responses]
+    with StructurePropertyCache(
+        path=tmp_path / "cache.db", backend="rdkit", version="test"
+    ) as cache:
+        assert len(cache.get_many(digests)) == 3
+        assert len(cache.get_failures(digests)) == 1
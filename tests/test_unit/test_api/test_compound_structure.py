@@ -0,0 +1,161 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of the compound structure API."""
+
+
+import pytest
+from cobra_component_models.orm import Compound
+
+from metanetx_post.api.compound import structure as structure_api
+from metanetx_post.etl import StructurePropertyCache
+
+
+# The expected values are those computed by RDKit.
+rdkit_adapter = pytest.mark.parametrize("molecule_adapter", ["rdkit"], indirect=True)
+
+
+@rdkit_adapter
+@pytest.mark.parametrize("processes, timeout", [(1, None), (2, None), (2, 10)])
+def test_augment_information(session, molecule_adapter, processes, timeout):
+    """Expect missing properties to be filled in independent of the processes."""
+    water = Compound(inchi="InChI=1S/H2O/h1H2")
+    ethanol = Compound(smiles="CCO", chemical_formula="given")
+    unknown = Compound(inchi="InChI=1S/C2H5R/c1-2-3/h2H2,1H3/q*")
+    session.add_all([water, ethanol, unknown])
+    session.commit()
+    structure_api.augment_information(
+        session,
+        molecule_adapter,
+        batch_size=2,
+        processes=processes,
+        chunk_size=1,
+        timeout=timeout,
+    )
+    session.expire_all()
+    assert water.inchi_key == "XLYOFNOQVPJJNP-UHFFFAOYSA-N"
+    assert water.smiles == "O"
+    assert water.chemical_formula == "H2O"
+    assert water.mass == pytest.approx(18.015, abs=1e-3)
+    assert water.charge == 0
+    assert ethanol.inchi == "InChI=1S/C2H6O/c1-2-3/h3H,2H2,1H3"
+    assert ethanol.chemical_formula == "given"
+    assert unknown.inchi_key is None
+
+
+@rdkit_adapter
+def test_augment_information_resume(session, molecule_adapter, tmp_path):
+    """Expect processing to resume after the checkpoint and to remove it."""
+    first = Compound(inchi="InChI=1S/H2O/h1H2")
+    second = Compound(smiles="CCO")
+    session.add_all([first, second])
+    session.commit()
+    checkpoint = tmp_path / "checkpoint.txt"
+    checkpoint.write_text(str(first.id))
+    structure_api.augment_information(
+        session, molecule_adapter, batch_size=1, checkpoint=checkpoint
+    )
+    session.expire_all()
+    assert first.inchi_key is None
+    assert second.inchi_key == "LFQSCWFLJHTTHZ-UHFFFAOYSA-N"
+    assert not checkpoint.exists()
+
+
+@rdkit_adapter
+def test_augment_information_cache(session, molecule_adapter, tmp_path):
+    """Expect cached properties to be used and computed ones and failures stored."""
+    water = Compound(inchi="InChI=1S/H2O/h1H2")
+    ethanol = Compound(smiles="CCO")
+    invalid = Compound(inchi="InChI=1S/invalid")
+    session.add_all([water, ethanol, invalid])
+    session.commit()
+    with StructurePropertyCache(
+        path=tmp_path / "cache.db", backend="rdkit", version="test"
+    ) as cache:
+        cache.put_many(
+            {
+                "InChI=1S/H2O/h1H2": {
+                    "inchi": "InChI=1S/H2O/h1H2",
+                    "inchi_key": "cached",
+                    "smiles": "O",
+                    "chemical_formula": "H2O",
+                    "mass": 18.0,
+                    "charge": 0,
+                }
+            }
+        )
+        structure_api.augment_information(session, molecule_adapter, cache=cache)
+        assert cache.get_many(["CCO"])["CCO"]["chemical_formula"] == "C2H6O"
+        assert cache.get_failures(["InChI=1S/invalid"]) == {
+            "InChI=1S/invalid": "Failed to generate a molecule from InChI."
+        }
+    session.expire_all()
+    assert water.inchi_key == "cached"
+    assert ethanol.inchi_key == "LFQSCWFLJHTTHZ-UHFFFAOYSA-N"
+
+
+def test_augment_information_inchi_layers(session):
+    """Expect formula and charge from the InChI and unknown groups to be skipped."""
+
+    class ForbiddenAdapter:
+        """Fail on any attempt to construct a molecule."""
+
+        inchi_layer_properties = ("chemical_formula", "charge")
+
+        @classmethod
+        def from_inchi(cls, inchi):
+            raise AssertionError("No molecule should be constructed.")
+
+    acetate = Compound(
+        inchi="InChI=1S/C2H4O2/c1-2(3)4/h1H3,(H,3,4)/p-1",
+        inchi_key="QTBSBXVTEAMEQO-UHFFFAOYSA-M",
+        smiles="CC(=O)[O-]",
+        mass=59.044,
+    )
+    unknown = [
+        Compound(smiles="*C(=O)[O-]"),
+        Compound(inchi="InChI=1S/C2H5Zz/c1-2-3/h2H2,1H3"),
+    ]
+    session.add_all([acetate, *unknown])
+    session.commit()
+    structure_api.augment_information(session, ForbiddenAdapter)
+    session.expire_all()
+    assert acetate.chemical_formula == "C2H3O2-"
+    assert acetate.charge == -1
+
+
+@rdkit_adapter
+def test_augment_information_inchi_charge(session, molecule_adapter):
+    """Expect a toolkit's own formula unless it agrees with the InChI layers."""
+
+    class ChargeAdapter(molecule_adapter):
+        """Read only the charge from the InChI and record constructed molecules."""
+
+        inchi_layer_properties = ("charge",)
+        constructed = []
+
+        @classmethod
+        def from_inchi(cls, inchi):
+            cls.constructed.append(inchi)
+            return super().from_inchi(inchi)
+
+    magnesium = Compound(inchi="InChI=1S/Mg/q+2", inchi_key="k", smiles="s", mass=1)
+    session.add(magnesium)
+    session.commit()
+    structure_api.augment_information(session, ChargeAdapter)
+    session.expire_all()
+    assert ChargeAdapter.constructed == ["InChI=1S/Mg/q+2"]
+    assert magnesium.chemical_formula == "Mg+2"
+    assert magnesium.charge == 2
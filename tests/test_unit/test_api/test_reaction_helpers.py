@@ -0,0 +1,204 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of the reaction name loading helpers."""
+
+
+import pandas as pd
+import pytest
+from cobra_component_models.orm import (
+    Namespace,
+    Reaction,
+    ReactionAnnotation,
+    ReactionName,
+)
+
+from metanetx_post.api import helpers as api_helpers
+from metanetx_post.api.reaction import expasy as expasy_api
+from metanetx_post.api.reaction import kegg as kegg_api
+from metanetx_post.api.reaction.helpers import (
+    collect_new_names,
+    explode_names,
+    load_reaction_names,
+    select_unnamed_identifiers,
+)
+from metanetx_post.etl import KEGGResponseStore
+
+
+def test_collect_new_names():
+    """Expect only names missing from a reaction to be collected once."""
+    df = pd.DataFrame(
+        {
+            "id": [1, 1, 2],
+            "identifier": ["R1", "R1", "R2"],
+            "name": ["a", "b", "c"],
+        }
+    )
+    id2names = {"R1": {"a", "d"}, "R2": ["c", "e", "e"]}
+    result = collect_new_names(df, id2names)
+    assert sorted(result.itertuples(index=False, name=None)) == [(1, "d"), (2, "e")]
+    exploded = collect_new_names(df, id2names, names=explode_names(id2names))
+    assert exploded.equals(result)
+
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_load_expasy(session, vectorized):
+    """Expect both loading strategies to insert the same names."""
+    ec_ns = session.query(Namespace).filter_by(prefix="ec-code").one()
+    reactions = []
+    for identifiers in [["1.1.1.1"], ["1.1.1.2", "9.9.9.9"], ["2.2.2.2"]]:
+        reaction = Reaction()
+        reaction.annotation.extend(
+            ReactionAnnotation(identifier=i, namespace=ec_ns) for i in identifiers
+        )
+        reaction.names.append(ReactionName(name="existing", namespace=ec_ns))
+        reactions.append(reaction)
+    session.add_all(reactions)
+    session.commit()
+    expasy_api.load(
+        session,
+        {
+            "1.1.1.1": ["existing", "alcohol dehydrogenase"],
+            "1.1.1.2": ["alcohol dehydrogenase (NADP+)"],
+            "3.3.3.3": ["replacement"],
+        },
+        {"9.9.9.9": "3.3.3.3"},
+        batch_size=1,
+        vectorized=vectorized,
+    )
+    index = {r.id: i for i, r in enumerate(reactions)}
+    result = {
+        (index[n.reaction_id], n.name)
+        for n in session.query(ReactionName).filter(ReactionName.name != "existing")
+    }
+    assert result == {
+        (0, "alcohol dehydrogenase"),
+        (1, "alcohol dehydrogenase (NADP+)"),
+        (1, "replacement"),
+    }
+
+
+@pytest.mark.parametrize(
+    "vectorized, streaming", [(True, False), (False, False), (True, True)]
+)
+def test_load_reaction_names(session, vectorized, streaming):
+    """Expect names of the given namespace only, also for reactions without any."""
+    kegg_ns = session.query(Namespace).filter_by(prefix="kegg.reaction").one()
+    seed_ns = session.query(Namespace).filter_by(prefix="seed.reaction").one()
+    unnamed = Reaction()
+    unnamed.annotation.append(ReactionAnnotation(identifier="R1", namespace=kegg_ns))
+    other = Reaction()
+    other.annotation.append(ReactionAnnotation(identifier="R1", namespace=seed_ns))
+    named = Reaction()
+    named.annotation.append(ReactionAnnotation(identifier="R2", namespace=kegg_ns))
+    named.names.append(ReactionName(name="water", namespace=seed_ns))
+    session.add_all([unnamed, other, named])
+    session.commit()
+    load_reaction_names(
+        session,
+        "kegg.reaction",
+        {"R1": "glucose", "R2": ["water"]},
+        batch_size=1,
+        vectorized=vectorized,
+        streaming=streaming,
+    )
+    result = {
+        (n.reaction_id, n.name)
+        for n in session.query(ReactionName).filter_by(namespace_id=kegg_ns.id)
+    }
+    assert result == {(unnamed.id, "glucose"), (named.id, "water")}
+
+
+def test_load_reaction_names_streaming_file(file_session):
+    """Expect streaming to insert names into a database file without locking it."""
+    session = file_session
+    kegg_ns = session.query(Namespace).filter_by(prefix="kegg.reaction").one()
+    reactions = []
+    for identifier in ["R1", "R2", "R3"]:
+        reaction = Reaction()
+        reaction.annotation.append(
+            ReactionAnnotation(identifier=identifier, namespace=kegg_ns)
+        )
+        reactions.append(reaction)
+    session.add_all(reactions)
+    session.commit()
+    first, second, third = [r.id for r in reactions]
+    load_reaction_names(
+        session,
+        "kegg.reaction",
+        {"R1": "glucose", "R2": "water", "R3": ["oxygen", "dioxygen"]},
+        batch_size=1,
+        streaming=True,
+    )
+    result = {
+        (n.reaction_id, n.name)
+        for n in session.query(ReactionName).filter_by(namespace_id=kegg_ns.id)
+    }
+    assert result == {
+        (first, "glucose"),
+        (second, "water"),
+        (third, "oxygen"),
+        (third, "dioxygen"),
+    }
+
+
+@pytest.fixture()
+def kegg_reactions(session):
+    """Provide reactions with KEGG annotations of which one is named already."""
+    kegg_ns = session.query(Namespace).filter_by(prefix="kegg.reaction").one()
+    bigg_ns = session.query(Namespace).filter_by(prefix="bigg.reaction").one()
+    reactions = []
+    for identifiers, namespace in [
+        (["R00001", "R00002"], kegg_ns),
+        (["R00002", "R00003"], kegg_ns),
+        (["R00004"], bigg_ns),
+    ]:
+        reaction = Reaction()
+        reaction.annotation.extend(
+            ReactionAnnotation(identifier=i, namespace=kegg_ns) for i in identifiers
+        )
+        reaction.names.append(ReactionName(name="existing", namespace=namespace))
+        reactions.append(reaction)
+    session.add_all(reactions)
+    session.commit()
+    return reactions
+
+
+def test_select_unnamed_identifiers(session, kegg_reactions):
+    """Expect only identifiers of reactions without names from the namespace."""
+    assert select_unnamed_identifiers(session, "kegg.reaction") == ["R00004"]
+
+
+def test_extract_kegg_targeted(session, kegg_reactions, tmp_path, monkeypatch):
+    """Expect only unnamed reactions to be fetched and merged into the store."""
+    requested = []
+
+    async def fetch_kegg_resources(identifiers, *args, store, **kwargs):
+        requested.extend(identifiers)
+        for identifier in identifiers:
+            store.append(identifier, 200, f"ENTRY       {identifier}\n///\n")
+        return pd.DataFrame(columns=["identifier", "status_code", "response"])
+
+    async def fetch_kegg_entries(*args, **kwargs):
+        raise AssertionError("The KEGG list should not be requested.")
+
+    monkeypatch.setattr(api_helpers, "fetch_kegg_resources", fetch_kegg_resources)
+    monkeypatch.setattr(api_helpers, "fetch_kegg_entries", fetch_kegg_entries)
+    store = KEGGResponseStore(path=tmp_path / "store.jsonl")
+    with store:
+        store.append("R00001", 200, "ENTRY       R00001\n///\n")
+    responses = kegg_api.extract(store=store, session=session)
+    assert requested == ["R00004"]
+    assert [r.identifier for r in responses] == ["R00001", "R00004"]
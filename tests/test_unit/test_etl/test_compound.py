@@ -0,0 +1,46 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of compound ETL functions."""
+
+
+import pytest
+
+from metanetx_post.etl import split_kegg_mol_blocks
+
+
+MOL = "\n  KCF2MOL\n\n  0  0  0  0  0  0  0  0  0  0999 V2000\nM  END\n"
+
+
+def test_split_kegg_mol_blocks_by_entry():
+    """Expect MOL blocks to be matched by their ENTRY data item."""
+    text = (
+        f"{MOL}> <ENTRY>\ncpd:C00002\n\n$$$$\n"
+        f"{MOL}> <ENTRY>\ncpd:C00001\n\n$$$$\n"
+    )
+    result = split_kegg_mol_blocks(["C00001", "C00002", "C00003"], text)
+    assert result == {"C00001": MOL, "C00002": MOL}
+
+
+def test_split_kegg_mol_blocks_by_order():
+    """Expect MOL blocks without data items to be matched by order."""
+    result = split_kegg_mol_blocks(["C00001", "C00002"], f"{MOL}$$$$\n{MOL}$$$$\n")
+    assert result == {"C00001": MOL, "C00002": MOL}
+
+
+def test_split_kegg_mol_blocks_ambiguous():
+    """Expect an error if MOL blocks cannot be matched unambiguously."""
+    with pytest.raises(ValueError):
+        split_kegg_mol_blocks(["C00001", "C00002"], f"{MOL}$$$$\n")
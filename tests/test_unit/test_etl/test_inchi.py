@@ -0,0 +1,91 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of reading properties from InChI layers."""
+
+
+import re
+
+import pytest
+
+from metanetx_post.etl import parse_inchi_formula_and_charge, split_inchi_layers
+
+
+SMILES = [
+    "O",
+    "[H+]",
+    "[H][H]",
+    "[Fe+3]",
+    "[NH4+]",
+    "[2H]O[2H]",
+    "CC(=O)[O-]",
+    "OP(=O)([O-])[O-]",
+    "[O-][N+](=O)[O-]",
+    "C[N+](C)(C)C",
+    "[Na+].[Cl-]",
+    "[Br-].[Br-].[Mg+2]",
+    "Cl",
+    "[CaH2]",
+    "[BH4-]",
+    "[Fe+2].O",
+    "[Ca+2].CC(=O)[O-].CC(=O)[O-]",
+    "OC(=O)CCC(=O)[O-].[O-]C(=O)CCC(=O)[O-]",
+    "N[C@@H](C)C(=O)O",
+    "C1=CC(=C[N+](=C1)C2C(C(C(O2)COP(=O)([O-])OP(=O)(O)OCC3C(C(C(O3)N4C=NC5=C(N=CN="
+    "C54)N)O)O)O)O)C(=O)N",
+]
+
+
+@pytest.mark.parametrize(
+    "inchi, expected",
+    [
+        ("InChI=1S/p+1", {"p": "+1"}),
+        (
+            "InChI=1S/H2O/h1H2/i/hD2",
+            {"": "H2O", "h": "1H2", "i": ""},
+        ),
+        (
+            "InChI=1/C2H4O2/c1-2(3)4/h1H3,(H,3,4)/p-1/fC2H3O2/h3h/q-1",
+            {"": "C2H4O2", "c": "1-2(3)4", "h": "1H3,(H,3,4)", "p": "-1"},
+        ),
+    ],
+)
+def test_split_inchi_layers(inchi, expected):
+    """Expect the main layers to be split by prefix."""
+    assert split_inchi_layers(inchi) == expected
+
+
+@pytest.mark.parametrize(
+    "inchi", ["C2H6O", "InChI=1S/C2H6O/q+x", "InChI=1S/C2h6", "InChI=1S/invalid"]
+)
+def test_parse_invalid(inchi):
+    """Expect uninterpretable strings to yield no result."""
+    assert parse_inchi_formula_and_charge(inchi) is None
+
+
+@pytest.mark.parametrize("smiles", SMILES)
+def test_agreement(molecule_adapter, smiles):
+    """Expect the formula and charge to agree with the chem-informatics toolkits."""
+    molecule = molecule_adapter.from_smiles(smiles)
+    formula, charge = parse_inchi_formula_and_charge(molecule.get_inchi())
+    assert charge == molecule.get_charge()
+    expected = molecule.get_chemical_formula()
+    if "chemical_formula" not in molecule_adapter.inchi_layer_properties:
+        # The backend formats formulae differently such that its formula is never
+        # read from the InChI. Only the element counts need to agree.
+        expected, formula = (
+            sorted(re.findall(r"[A-Z][a-z]?\d*", f)) for f in (expected, formula)
+        )
+    assert formula == expected
@@ -0,0 +1,113 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of KEGG helper functions."""
+
+
+import asyncio
+
+import httpx
+import pytest
+
+from metanetx_post.etl import (
+    AdaptiveTokenBucket,
+    fetch_kegg_resources,
+    split_kegg_flat_file,
+)
+from metanetx_post.etl.kegg_helpers import fetch_resource
+
+
+R1 = "ENTRY       R00001                      Reaction\nNAME        a\n///\n"
+R2 = "ENTRY       R00002                      Reaction\nNAME        b\n///\n"
+
+
+def test_split_kegg_flat_file():
+    """Expect concatenated entries to be mapped back to their identifiers."""
+    result = split_kegg_flat_file(["R00001", "R00002", "R00003"], R1 + R2)
+    assert result == {"R00001": R1, "R00002": R2}
+
+
+def test_split_kegg_flat_file_unknown_entry():
+    """Expect an error for entries that were not requested."""
+    with pytest.raises(ValueError):
+        split_kegg_flat_file(["R00001"], R1 + R2)
+
+
+def test_fetch_kegg_resources_throttled():
+    """Expect throttled requests to be repeated at a reduced rate."""
+    attempts = []
+
+    async def fetcher(identifier, client):
+        attempts.append(identifier)
+        if len(attempts) <= 2:
+            return httpx.Response(429)
+        return httpx.Response(200, text=R1)
+
+    result = asyncio.run(
+        fetch_kegg_resources(
+            ["R00001", "R00002"],
+            fetcher,
+            "http://localhost",
+            requests_per_second=100,
+            max_concurrency=2,
+        )
+    )
+    assert len(attempts) == 4
+    assert result["status_code"].tolist() == [200, 200]
+
+
+def test_fetch_resource_transient():
+    """Expect network and server errors to be retried until a response succeeds."""
+    outcomes = [httpx.ConnectError("reset"), httpx.Response(503), httpx.Response(200)]
+
+    async def fetcher(identifier, client):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def fetch():
+        return await fetch_resource(
+            "R00001", None, fetcher, AdaptiveTokenBucket(rate=100), base_delay=0.01
+        )
+
+    assert asyncio.run(fetch())[1] == 200
+    assert outcomes == []
+
+
+def test_fetch_kegg_resources_give_up():
+    """Expect hung and failing requests to be recorded instead of aborting."""
+
+    async def fetcher(identifier, client):
+        if identifier == "R00001":
+            await asyncio.sleep(60)
+        if identifier == "R00002":
+            raise httpx.ReadError("reset")
+        return httpx.Response(200, text=R1)
+
+    result = asyncio.run(
+        fetch_kegg_resources(
+            ["R00001", "R00002", "R00003"],
+            fetcher,
+            "http://localhost",
+            requests_per_second=100,
+            max_concurrency=3,
+            connect_timeout=0.05,
+            read_timeout=0.05,
+            max_retries=0,
+        )
+    )
+    statuses = dict(zip(result["identifier"], result["status_code"]))
+    assert statuses == {"R00001": 0, "R00002": 0, "R00003": 200}
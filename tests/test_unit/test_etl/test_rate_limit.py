@@ -0,0 +1,144 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of rate limiters."""
+
+
+import asyncio
+import multiprocessing
+import sqlite3
+import time
+
+import pytest
+
+from metanetx_post.etl import AdaptiveTokenBucket, SharedTokenBucket, TokenBucket
+
+
+def acquire_shared(path, num, queue):
+    """Acquire a number of tokens concurrently from a shared bucket."""
+
+    async def acquire():
+        await bucket.acquire()
+        # The wall clock is shared between processes.
+        return time.time()
+
+    async def acquire_all():
+        return await asyncio.gather(*[acquire() for _ in range(num)])
+
+    with SharedTokenBucket(path=path, rate=50) as bucket:
+        queue.put(asyncio.run(acquire_all()))
+
+
+@pytest.mark.parametrize("rate, capacity", [(0, 1), (10, 0.5)])
+def test_token_bucket_arguments(rate, capacity):
+    """Expect invalid rates and capacities to be rejected."""
+    with pytest.raises(ValueError):
+        TokenBucket(rate=rate, capacity=capacity)
+
+
+def test_token_bucket_rate():
+    """Expect concurrent acquisitions to be spaced according to the rate."""
+    bucket = TokenBucket(rate=50)
+
+    async def acquire_all(num):
+        await asyncio.gather(*[bucket.acquire() for _ in range(num)])
+
+    start = time.monotonic()
+    asyncio.run(acquire_all(26))
+    # The first token is available immediately, the remaining 25 take half a second.
+    assert time.monotonic() - start == pytest.approx(0.5, abs=0.1)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"min_rate": 20}, {"decrease": 1}, {"increase": 0}],
+)
+def test_adaptive_token_bucket_arguments(kwargs):
+    """Expect invalid adaptation parameters to be rejected."""
+    with pytest.raises(ValueError):
+        AdaptiveTokenBucket(rate=10, **kwargs)
+
+
+def test_adaptive_token_bucket_aimd():
+    """Expect one cut per wave of throttled requests and a bounded recovery."""
+    bucket = AdaptiveTokenBucket(rate=10, min_rate=2, decrease=0.5, increase=10)
+    issued = time.monotonic()
+    # Concurrent requests issued before the cut do not cut the rate again.
+    for _ in range(3):
+        bucket.throttled(issued)
+    assert bucket.rate == pytest.approx(5)
+    assert bucket.num_decreases == 1
+    for _ in range(2):
+        bucket.throttled(time.monotonic())
+    assert bucket.rate == pytest.approx(2)
+    bucket.succeeded()
+    assert bucket.rate == pytest.approx(7)
+    for _ in range(10):
+        bucket.succeeded()
+    assert bucket.rate == pytest.approx(10)
+
+
+def test_shared_token_bucket_rate(tmp_path):
+    """Expect concurrent processes to draw from a single budget."""
+    path = tmp_path / "bucket.db"
+    # Create the full bucket before starting the processes.
+    with SharedTokenBucket(path=path, rate=50):
+        pass
+    queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=acquire_shared, args=(path, 13, queue))
+        for _ in range(2)
+    ]
+    for process in processes:
+        process.start()
+    # The acquisitions are timed within the processes since starting them may take
+    # longer than acquiring all tokens.
+    times = sorted(t for _ in processes for t in queue.get(timeout=60))
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+    assert len(times) == 26
+    # However the processes overlap, no more than the rate plus the single token of
+    # capacity are acquired within any fifth of a second.
+    assert max(sum(t <= u < t + 0.2 for u in times) for t in times) <= 11 + 1
+    # The first token is available immediately, the remaining 25 take half a second.
+    assert times[-1] - times[0] >= 0.5 - 0.05
+
+
+def test_shared_token_bucket_locked(tmp_path):
+    """Expect a bucket locked by another process not to block the event loop."""
+    path = tmp_path / "bucket.db"
+    other = sqlite3.connect(path, isolation_level=None)
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def acquire_locked():
+        with SharedTokenBucket(path=path, rate=50) as bucket:
+            other.execute("BEGIN IMMEDIATE")
+            asyncio.get_running_loop().call_later(0.3, other.execute, "COMMIT")
+            ticker = asyncio.create_task(tick())
+            start = time.monotonic()
+            await bucket.acquire()
+            ticker.cancel()
+            return start
+
+    start = asyncio.run(acquire_locked())
+    other.close()
+    # The loop kept ticking while the bucket was locked.
+    assert sum(start < t < start + 0.3 for t in ticks) > 10
@@ -0,0 +1,56 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of the KEGG response store."""
+
+
+from metanetx_post.etl import KEGGResponseStore
+
+
+def test_fetched(tmp_path):
+    """Expect only identifiers with a final latest response to count as fetched."""
+    store = KEGGResponseStore(path=tmp_path / "responses.jsonl")
+    assert store.fetched() == set()
+    with store:
+        store.append("C00001", 200, "mol")
+        store.append("C00002", 404, "")
+        store.append("C00003", 500, "error")
+        store.append("C00004", 200, "mol")
+        store.append("C00004", 500, "error")
+    assert store.fetched() == {"C00001", "C00002"}
+
+
+def test_iter_responses_latest(tmp_path):
+    """Expect the latest response per identifier to take precedence."""
+    store = KEGGResponseStore(path=tmp_path / "responses.jsonl")
+    with store:
+        store.append("C00001", 500, "error")
+        store.append("C00002", 200, "mol")
+        store.append("C00001", 200, "mol")
+    assert [r.dict() for r in store.iter_responses()] == [
+        {"identifier": "C00002", "status_code": 200, "response": "mol"},
+        {"identifier": "C00001", "status_code": 200, "response": "mol"},
+    ]
+    assert [r.identifier for r in store.iter_responses(["C00001"])] == ["C00001"]
+
+
+def test_resume_after_truncation(tmp_path):
+    """Expect a line cut short by an interrupted process to be skipped."""
+    path = tmp_path / "responses.jsonl"
+    path.write_text('{"identifier":"C00001","status_code":200,"response":"mol"}\n{"id')
+    store = KEGGResponseStore(path=path)
+    with store:
+        store.append("C00002", 200, "mol")
+    assert store.fetched() == {"C00001", "C00002"}
@@ -0,0 +1,93 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of the structure property cache."""
+
+
+import pytest
+
+from metanetx_post.etl import StructurePropertyCache
+
+
+def compute_all(structures):
+    """Compute fake properties and fail for structures containing an asterisk."""
+    return [
+        "Unknown group." if "*" in s else {"inchi": s.upper(), "mass": 1.5}
+        for s in structures
+    ]
+
+
+def test_max_entries(tmp_path):
+    """Expect a non-positive maximum number of entries to be rejected."""
+    with pytest.raises(ValueError):
+        StructurePropertyCache(
+            path=tmp_path / "cache.db", backend="a", version="1", max_entries=0
+        )
+
+
+def test_get_or_compute(tmp_path):
+    """Expect only uncached structures to be computed and failures to be skipped."""
+    path = tmp_path / "cache.db"
+    computed = []
+
+    def compute(structures):
+        computed.extend(structures)
+        return compute_all(structures)
+
+    with StructurePropertyCache(path=path, backend="a", version="1") as cache:
+        assert cache.get_or_compute(["x", "*"], compute) == [
+            {"inchi": "X", "mass": 1.5},
+            None,
+        ]
+    with StructurePropertyCache(path=path, backend="a", version="1") as cache:
+        result = cache.get_or_compute(["x", "y", "*"], compute)
+    assert result[0]["mass"] == 1.5 and result[0]["charge"] is None
+    assert [r and r["inchi"] for r in result] == ["X", "Y", None]
+    assert computed == ["x", "*", "y"]
+    assert cache.statistics == {"hits": 1, "skipped": 1, "computed": 1, "failed": 0}
+    # A different backend version does not use the previous entries.
+    with StructurePropertyCache(path=path, backend="a", version="2") as cache:
+        assert cache.get_many(["x", "y"]) == {}
+
+
+def test_evict(tmp_path):
+    """Expect the least recently used entries to be evicted on closing."""
+    path = tmp_path / "cache.db"
+    with StructurePropertyCache(
+        path=path, backend="a", version="1", max_entries=2
+    ) as cache:
+        cache.put_many({"x": {"inchi": "X"}, "y": {"inchi": "Y"}})
+        cache.get_many(["x"])
+        cache.put_many({"z": {"inchi": "Z"}})
+    with StructurePropertyCache(path=path, backend="a", version="1") as cache:
+        assert sorted(cache.get_many(["x", "y", "z"])) == ["x", "z"]
+
+
+def test_retry_failed(tmp_path, caplog):
+    """Expect failures to be retried on demand and summarized."""
+    path = tmp_path / "cache.db"
+    with StructurePropertyCache(path=path, backend="a", version="1") as cache:
+        cache.get_or_compute(["*", "**"], compute_all)
+    with StructurePropertyCache(
+        path=path, backend="a", version="1", retry_failed=True
+    ) as cache:
+        assert cache.get_or_compute(["*"], lambda jobs: [{"inchi": "Z"}]) == [
+            {"inchi": "Z"}
+        ]
+        with caplog.at_level("INFO"):
+            cache.summarize()
+        assert cache.get_failures(["*", "**"]) == {"**": "Unknown group."}
+    assert "The failure ledger contains 1 structures for a 1." in caplog.text
+    assert "Unknown group.: 1 (100.00%)" in caplog.text
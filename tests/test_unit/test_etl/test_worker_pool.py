@@ -0,0 +1,119 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of the isolated worker pool."""
+
+
+import os
+import time
+
+import pytest
+
+from metanetx_post.etl import IsolatedWorkerPool, create_worker_map
+
+
+_greeting = None
+
+
+def _init(greeting):
+    """Set the greeting of a worker."""
+    global _greeting
+    _greeting = greeting
+
+
+def _greet(name):
+    """Return a greeting using the worker's state."""
+    return f"{_greeting}, {name}!"
+
+
+def _nap(seconds):
+    """Sleep for the given number of seconds."""
+    time.sleep(seconds)
+    return seconds
+
+
+def _die(code):
+    """Terminate the worker process abruptly for a non-zero code."""
+    if code:
+        os._exit(code)
+    return code
+
+
+def _fail(item):
+    """Raise an error."""
+    raise ValueError(item)
+
+
+@pytest.mark.parametrize("processes, timeout", [(0, 1), (1, 0)])
+def test_arguments(processes, timeout):
+    """Expect invalid numbers of processes and timeouts to be rejected."""
+    with pytest.raises(ValueError):
+        IsolatedWorkerPool(processes=processes, timeout=timeout)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_imap(processes):
+    """Expect results in order of submission using the initialized worker state."""
+    names = [f"n{i}" for i in range(10)]
+    with IsolatedWorkerPool(
+        processes=processes, timeout=10, initializer=_init, initargs=("Hi",)
+    ) as pool:
+        assert list(pool.imap(_greet, names)) == [f"Hi, {n}!" for n in names]
+    assert pool.offenders == []
+
+
+def test_imap_timeout():
+    """Expect workers exceeding the deadline to be replaced and items reported."""
+    with IsolatedWorkerPool(processes=1, timeout=0.5) as pool:
+        start = time.monotonic()
+        result = list(pool.imap(_nap, [0, 30, 0.1, 60], default="late"))
+        assert time.monotonic() - start < 5
+    assert result == [0, "late", 0.1, "late"]
+    assert pool.offenders == [30, 60]
+
+
+def test_imap_crash():
+    """Expect workers that die to be replaced and reported apart from timeouts."""
+    with IsolatedWorkerPool(processes=2, timeout=10) as pool:
+        assert list(pool.imap(_die, [0, 3, 0, 0])) == [0, None, 0, 0]
+        result = list(pool.imap(_die, [3, 0], default="late", crashed="dead"))
+    assert result == ["dead", 0]
+    assert pool.offenders == []
+
+
+def test_imap_error():
+    """Expect exceptions raised by the function to be re-raised."""
+    with IsolatedWorkerPool(processes=1, timeout=10) as pool:
+        with pytest.raises(ValueError, match="boom"):
+            list(pool.imap(_fail, ["boom"]))
+
+
+def test_imap_abandoned():
+    """Expect an abandoned iteration not to leak results into the next one."""
+    with IsolatedWorkerPool(processes=2, timeout=10) as pool:
+        results = pool.imap(_nap, [0, 0.2, 0.2])
+        assert next(results) == 0
+        results.close()
+        assert list(pool.imap(_nap, [0.01, 0.02])) == [0.01, 0.02]
+
+
+@pytest.mark.parametrize("processes, timeout", [(1, None), (2, None), (2, 10)])
+def test_create_worker_map(processes, timeout):
+    """Expect every kind of worker map to return the results in order."""
+    pool, compute = create_worker_map(
+        _nap, processes=processes, chunk_size=2, timeout=timeout
+    )
+    with pool:
+        assert list(compute([0.02, 0, 0.01])) == [0.02, 0, 0.01]
@@ -0,0 +1,38 @@
+# Copyright (c) 2020, Moritz E. Beber.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Ensure the expected behavior of the molecule adapters."""
+
+
+import pytest
+
+
+@pytest.mark.parametrize("smiles", ["O", "CC(=O)[O-]", "C[N+](C)(C)C"])
+def test_compute_properties(molecule_adapter, smiles):
+    """Expect all properties computed at once to equal the individual getters."""
+    molecule = molecule_adapter.from_smiles(smiles)
+    expected = {
+        field: getattr(molecule, getter)()
+        for field, getter in molecule_adapter.properties.items()
+    }
+    assert molecule.compute_properties(molecule_adapter.properties) == expected
+
+
+def test_compute_many(molecule_adapter):
+    """Expect properties in the order of the structures or none for failures."""
+    result = molecule_adapter.compute_many(
+        ["InChI=1S/H2O/h1H2", "InChI=1S/invalid"], fields=["inchi_key", "charge"]
+    )
+    assert result == [{"inchi_key": "XLYOFNOQVPJJNP-UHFFFAOYSA-N", "charge": 0}, None]